@@ -11,6 +11,8 @@ from tensorflow.keras.models import Model
 # -- Private Imports
 from utils import *
 from constants import *
+from agents.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from agents.graph_replay_buffer import GraphReplayBuffer
 
 # -- Global Variables
 
@@ -23,17 +25,28 @@ class BaseAgentDQN:
         self.action_space = config.action_space
         self.action_mapper = ActionMapper(minVal=0, maxVal=self.action_space)
 
+        # Bit of the action index of every gNB, the first gNB is the most significant bit as in ActionMapper
+        num_gnbs = (self.action_space - 1).bit_length()
+        self.action_shifts = tf.range(num_gnbs - 1, -1, -1, dtype=tf.int32)
+
         self.agent_type = config.agent
 
         # Buffer
         self.buffer_capacity = config.buffer_capacity if hasattr(config, 'buffer_capacity') else int(1e4)
         self.batch_size = config.batch_size if hasattr(config, 'batch_size') else 128
-        self.buffer_counter = 0
-
-        self.state_buffer = np.zeros((self.buffer_capacity, self.state_space))
-        self.action_buffer = np.zeros((self.buffer_capacity, 1))
-        self.reward_buffer = np.zeros((self.buffer_capacity, 1))
-        self.next_state_buffer = np.zeros((self.buffer_capacity, self.state_space))
+        buffer_kwargs = dict(seed=getattr(config, 'seed', None), memmap_dir=getattr(config, 'buffer_memmap_dir', None))
+        self.graph_replay = getattr(config, 'graph_replay', False)
+        self.prioritized = getattr(config, 'per', False) and not self.graph_replay
+        if self.graph_replay:
+            self.buffer = GraphReplayBuffer(self.buffer_capacity, self.state_space, seed=buffer_kwargs['seed'])
+        elif self.prioritized:
+            self.buffer = PrioritizedReplayBuffer(self.buffer_capacity, self.state_space,
+                                                  alpha=getattr(config, 'per_alpha', 0.6),
+                                                  beta=getattr(config, 'per_beta', 0.4),
+                                                  beta_steps=getattr(config, 'per_beta_steps', int(1e5)),
+                                                  **buffer_kwargs)
+        else:
+            self.buffer = ReplayBuffer(self.buffer_capacity, self.state_space, **buffer_kwargs)
 
         # Hyper-parameters
         self.epsilon = config.epsilon
@@ -41,6 +54,7 @@ class BaseAgentDQN:
         self.epsilon_decay = config.epsilon_decay
         self.gamma = config.gamma  # Discount factor
         self.learning_rate = config.dqn_lr  # Learning rate for the DQN network
+        self.tau = getattr(config, 'tau', 0.001)  # Soft target update rate
         self.optimizer = tf.keras.optimizers.Adam(learning_rate=self.learning_rate)
         self.loss_func = tf.keras.losses.Huber()
         # self.loss_func = tf.keras.losses.MeanSquaredError()
@@ -51,6 +65,20 @@ class BaseAgentDQN:
         self.target_model.set_weights(self.model.get_weights())
         print(self.model.summary())
 
+        # Losses of the fused train steps, summed on the device until pop_loss
+        self.loss_sum = tf.Variable(0.0, trainable=False)
+        self.num_losses = tf.Variable(0.0, trainable=False)
+
+        # Exploration draws of the compiled action selection
+        seed = getattr(config, 'seed', None)
+        self.action_rng = tf.random.Generator.from_non_deterministic_state() if seed is None else \
+            tf.random.Generator.from_seed(seed)
+
+        # Compiled loops of fused train steps, optionally with XLA
+        jit_compile = getattr(config, 'jit_compile', False)
+        self.train_steps = tf.function(self.train_steps, jit_compile=jit_compile)
+        self.graph_train_steps = tf.function(self.graph_train_steps, jit_compile=jit_compile)
+
     def create_model(self):
         input_shape = (self.state_space, 1)  # Add a channel dimension (1) for the CNN
 
@@ -79,72 +107,163 @@ class BaseAgentDQN:
         return model
 
     def record(self, obs_tuple):
-        assert len(obs_tuple) == 4
-
-        index = self.buffer_counter % self.buffer_capacity
-        self.state_buffer[index] = obs_tuple[0]
-        self.action_buffer[index] = obs_tuple[1]
-        self.reward_buffer[index] = obs_tuple[2]
-        self.next_state_buffer[index] = obs_tuple[3]
-        self.buffer_counter += 1
+        """
+        Store a transition, or a batch of transitions from vectorized environments
+        :param obs_tuple: state, action index, reward, next state and done flag, with a leading (num_envs,) axis if
+        batched
+        """
+        assert len(obs_tuple) == 5
+        self.buffer.add(*obs_tuple)
 
     def act(self, state):
-        if not isinstance(state, np.ndarray):
-            state = np.array(state)
-
-        if state.ndim==1:
-            state = np.expand_dims(state, axis=0)
+        """
+        Select actions for a single state or a batch of states from vectorized environments
+        :param state: (state_space,) or (num_envs, state_space)
+        :return: boolean gNB activation mask(s) and action index(es)
+        """
+        # States of the environments are already float32 arrays and are passed on without copy
+        state = np.asarray(state, dtype=np.float32)
+
+        batched = state.ndim == 2
+        if not batched:
+            state = state[None]
 
         self.epsilon *= self.epsilon_decay
         self.epsilon = max(self.epsilon_min, self.epsilon)
 
-        # if np.random.random() < self.epsilon:
-        if self.epsilon:
-            action_idx = np.random.choice(self.action_space)
-        else:
-            q_vals_dist = self.model.predict(state, verbose=0)[0]
-            action_idx = tf.argmax(q_vals_dist).numpy()
+        action_idx, action = self.select_actions(state, tf.constant(self.epsilon, tf.float32))
+        action_idx, action = action_idx.numpy(), action.numpy()
 
-        action = self.action_mapper.idx_to_bool_action(action_idx)
+        if not batched:
+            return action[0], action_idx[0]
         return action, action_idx
 
+    @tf.function(reduce_retracing=True)
+    def select_actions(self, state, epsilon):
+        """
+        Epsilon-greedy actions of a batch of states: every environment explores with probability epsilon, otherwise
+        takes the action of the largest Q value
+        :param state: (batch_size, state_space) states
+        :return: (batch_size,) action indices and (batch_size, num_gnbs) boolean gNB activation masks
+        """
+        batch_size = tf.shape(state)[0]
+        draws = self.action_rng.uniform((2, batch_size))
+        explore = draws[0] < epsilon
+        random_idx = tf.minimum(tf.cast(draws[1] * self.action_space, tf.int32), self.action_space - 1)
+
+        # The forward pass is skipped when every environment explores
+        action_idx = tf.cond(tf.reduce_all(explore), lambda: random_idx, lambda: tf.where(
+            explore, random_idx, tf.argmax(self.model(state, training=False), axis=1, output_type=tf.int32)))
+
+        # Bits of the action indices, instead of ActionMapper.idx_to_bool_action string formatting
+        action = tf.bitwise.bitwise_and(tf.bitwise.right_shift(action_idx[:, None], self.action_shifts), 1) > 0
+
+        return action_idx, action
+
     def sample(self):
-        sample_indices = np.random.choice(min(self.buffer_counter, self.buffer_capacity), self.batch_size)
+        """
+        :return: batch of transitions sampled from the replay buffer on the host, with their importance-sampling
+        weights and slots
+        """
+        return self.buffer.sample(self.batch_size)
 
-        state_sample = tf.convert_to_tensor(self.state_buffer[sample_indices])
-        action_sample = tf.convert_to_tensor(self.action_buffer[sample_indices])
-        reward_sample = tf.cast(tf.convert_to_tensor(self.reward_buffer[sample_indices]), dtype=tf.float32)
-        next_state_sample = tf.convert_to_tensor(self.next_state_buffer[sample_indices])
+    def update(self):
+        if self.graph_replay:
+            return self.graph_update()
 
-        return state_sample, action_sample, reward_sample, next_state_sample
+        # Sampling runs in numpy, outside of the compiled train step, so every call draws a new batch
+        *batch, idx = self.sample()
+        loss, td_error = self.train_step(*batch)
+        if self.prioritized:
+            self.buffer.update_priorities(idx, td_error.numpy())
+
+        return loss
 
     @tf.function
-    def update(self):
-        state_sample, action_sample, reward_sample, next_state_sample = self.sample()
-        action_sample_int = tf.cast(tf.squeeze(action_sample), tf.int32)
+    def graph_update(self):
+        # Sampling and train step in one compiled call, the batch never leaves the device
+        loss, _ = self.train_step(*self.buffer.sample(self.batch_size))
+
+        return loss
 
+    @tf.function
+    def train_step(self, state_sample, action_sample, reward_sample, done_sample, next_state_sample, weights):
         target_q_vals = tf.reduce_max(self.target_model(next_state_sample), axis=1)
-        y = reward_sample + tf.expand_dims(self.gamma * target_q_vals, axis=1)
-        mask = tf.one_hot(action_sample_int, self.action_space)
+        y = reward_sample + self.gamma * (1 - tf.cast(done_sample, tf.float32)) * target_q_vals
+        mask = tf.one_hot(action_sample, self.action_space)
 
         with tf.GradientTape() as tape:
             q_vals = self.model(state_sample)
 
             q_action = tf.reduce_sum(tf.multiply(q_vals, mask), axis=1)
 
-            loss = self.loss_func(y, q_action)
+            # Importance-sampling weights of prioritized replay, ones for uniform sampling
+            loss = self.loss_func(y[:, None], q_action[:, None], sample_weight=weights)
 
         grads = tape.gradient(loss, self.model.trainable_variables)
         self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
 
-        return loss
+        return loss, y - q_action
 
     @tf.function
-    def update_target(self, tau=0.001):
-        # Update target actor
-        # self.target_model.set_weights(self.model.get_weights())
+    def update_target(self, tau=None):
+        # Soft update of the target model towards the model
+        tau = self.tau if tau is None else tau
         for (a, b) in zip(self.target_model.variables, self.model.variables):
-            a.assign(b * tau + (1 - tau))
+            a.assign(b * tau + a * (1 - tau))
+
+    def train(self, num_steps):
+        """
+        Run num_steps gradient steps, each followed by the soft target update, in one compiled call. Batches of the
+        host replay buffers are sampled up front and stacked, the graph replay buffer is sampled within the loop.
+        The losses stay on the device until pop_loss.
+        """
+        if self.graph_replay:
+            self.graph_train_steps(tf.constant(num_steps))
+            return
+
+        samples = [tuple(value.copy() for value in self.sample()) for _ in range(num_steps)]
+        *batches, idx = (np.stack(values) for values in zip(*samples))
+        td_errors = self.train_steps(*batches)
+
+        # Fetching the TD errors waits for the steps, only prioritized replay needs them
+        if self.prioritized:
+            self.buffer.update_priorities(idx.ravel(), td_errors.numpy().ravel())
+
+    def train_steps(self, state_batches, action_batches, reward_batches, done_batches, next_state_batches,
+                    weight_batches):
+        """
+        :return: (num_steps, batch_size) TD errors of the sampled transitions
+        """
+        num_steps = tf.shape(state_batches)[0]
+        td_errors = tf.TensorArray(tf.float32, size=num_steps)
+        for step in tf.range(num_steps):
+            loss, td_error = self.train_step(state_batches[step], action_batches[step], reward_batches[step],
+                                             done_batches[step], next_state_batches[step], weight_batches[step])
+            self.update_target()
+            self.loss_sum.assign_add(loss)
+            self.num_losses.assign_add(1.0)
+            td_errors = td_errors.write(step, td_error)
+
+        return td_errors.stack()
+
+    def graph_train_steps(self, num_steps):
+        for _ in tf.range(num_steps):
+            loss, _ = self.train_step(*self.buffer.sample(self.batch_size))
+            self.update_target()
+            self.loss_sum.assign_add(loss)
+            self.num_losses.assign_add(1.0)
+
+    def pop_loss(self):
+        """
+        Fetch the losses of the fused train steps since the last call from the device
+        :return: sum of the losses and number of gradient steps
+        """
+        loss_sum, num_losses = self.loss_sum.numpy(), self.num_losses.numpy()
+        self.loss_sum.assign(0.0)
+        self.num_losses.assign(0.0)
+
+        return float(loss_sum), int(num_losses)
 
     def save_model(self):
 
@@ -167,7 +286,7 @@ class BaseAgentDQN:
         with open(file_path, 'rb') as f:
             model_data = pickle.load(f)
 
-        self.model = Model.from_config(model_data.get('model_architecture'))
+        # Weights are loaded into the existing model, the compiled train and act functions hold its variables
         self.model.set_weights(model_data.get('model_weights'))
 
         print(f"Model loaded from {file_path}")
\ No newline at end of file
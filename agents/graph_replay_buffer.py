@@ -0,0 +1,93 @@
+# -- Public Imports
+import tensorflow as tf
+
+# -- Private Imports
+from agents.replay_buffer import get_block
+
+# -- Global Variables
+
+
+# -- Functions
+
+class GraphReplayBuffer:
+    """
+    Replay buffer held in tf.Variable tensors, on the device of the model, and sampled in-graph, so a compiled update
+    step draws a fresh batch without leaving TensorFlow. Same layout as ReplayBuffer: transitions are added in blocks
+    of one per environment, the next state of a transition is the state of the same environment in the following
+    block, next states of the last block are written ahead, and transitions whose next state was replaced by the
+    first state of a new episode are no longer sampled unless they are done.
+    """
+    def __init__(self, capacity, state_space, seed=None):
+        """
+        :param capacity: maximum number of stored states, rounded down to a multiple of the number of environments
+        :param state_space: size of a state
+        :param seed: seed of the in-graph sampling generator
+        """
+        self.capacity = capacity
+        self.state_space = state_space
+        self.rng = tf.random.Generator.from_non_deterministic_state() if seed is None else \
+            tf.random.Generator.from_seed(seed)
+
+        self.states = tf.Variable(tf.zeros((capacity, state_space), tf.float32), trainable=False)
+        self.actions = tf.Variable(tf.zeros(capacity, tf.int32), trainable=False)
+        self.rewards = tf.Variable(tf.zeros(capacity, tf.float32), trainable=False)
+        self.dones = tf.Variable(tf.zeros(capacity, tf.bool), trainable=False)
+        self.valid = tf.Variable(tf.zeros(capacity, tf.bool), trainable=False)
+        self.pos = tf.Variable(0, dtype=tf.int32, trainable=False)
+        self.size = tf.Variable(0, dtype=tf.int32, trainable=False)
+
+        # Number of environments per block, set by the first add before the graph functions are traced
+        self.num_envs = None
+
+    def add(self, state, action_idx, reward, next_state, done):
+        """
+        Add one transition, or a block of transitions with a leading (num_envs,) axis from vectorized environments
+        """
+        state, action_idx, reward, next_state, done = get_block(self, state, action_idx, reward, next_state, done)
+
+        self.add_block(tf.convert_to_tensor(state, tf.float32), tf.convert_to_tensor(action_idx, tf.int32),
+                       tf.convert_to_tensor(reward, tf.float32), tf.convert_to_tensor(next_state, tf.float32),
+                       tf.convert_to_tensor(done, tf.bool))
+
+    @tf.function
+    def add_block(self, state, action_idx, reward, next_state, done):
+        block = (self.pos + tf.range(self.num_envs))[:, None]
+        previous = (block - self.num_envs) % self.capacity
+
+        # Transitions of the previous block whose next state is overwritten by the first state of a new episode
+        continued = tf.reduce_all(tf.gather_nd(self.states, block) == state, axis=1)
+        self.valid.scatter_nd_update(previous, tf.gather_nd(self.valid, previous) &
+                                     (continued | tf.gather_nd(self.dones, previous)))
+
+        self.states.scatter_nd_update(block, state)
+        self.actions.scatter_nd_update(block, action_idx)
+        self.rewards.scatter_nd_update(block, reward)
+        self.dones.scatter_nd_update(block, done)
+        self.valid.scatter_nd_update(block, tf.ones(self.num_envs, tf.bool))
+
+        # Next states written ahead into the following block
+        self.pos.assign((self.pos + self.num_envs) % self.capacity)
+        ahead = (self.pos + tf.range(self.num_envs))[:, None]
+        self.states.scatter_nd_update(ahead, next_state)
+        self.valid.scatter_nd_update(ahead, tf.zeros(self.num_envs, tf.bool))
+        self.size.assign(tf.maximum(self.size, self.pos + self.num_envs))
+
+    def sample(self, batch_size):
+        """
+        Uniform in-graph sample of stored transitions, to be called within a tf.function
+        :return: (batch_size, state_space) states, (batch_size,) action indices, rewards and done flags,
+        (batch_size, state_space) next states and (batch_size,) importance-sampling weights (ones)
+        """
+        def draw():
+            return self.rng.uniform((batch_size,), 0, self.size, dtype=tf.int32)
+
+        def is_invalid(idx):
+            return tf.logical_not(tf.gather(self.valid, idx))
+
+        # Slots that cannot be sampled are drawn again
+        idx = tf.while_loop(lambda idx: tf.reduce_any(is_invalid(idx)),
+                            lambda idx: (tf.where(is_invalid(idx), draw(), idx),), (draw(),))[0]
+
+        return (tf.gather(self.states, idx), tf.gather(self.actions, idx), tf.gather(self.rewards, idx),
+                tf.gather(self.dones, idx), tf.gather(self.states, (idx + self.num_envs) % self.capacity),
+                tf.ones(batch_size, tf.float32))
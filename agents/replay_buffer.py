@@ -0,0 +1,295 @@
+# -- Public Imports
+import os
+import numpy as np
+
+# -- Private Imports
+
+# -- Global Variables
+
+
+# -- Functions
+
+def get_block(buffer, state, action_idx, reward, next_state, done):
+    """
+    Transitions of one add as a block with a leading (num_envs,) axis. The first block sets the number of environments
+    of the buffer and rounds its capacity down to a multiple of it, later blocks must have the same size.
+    :param buffer: ReplayBuffer or GraphReplayBuffer
+    :return: state, action_idx, reward, next_state and done of the block
+    """
+    if np.ndim(state) == 1:
+        state, action_idx, reward, next_state, done = (np.expand_dims(value, 0) for value in
+                                                       (state, action_idx, reward, next_state, done))
+    num_envs = len(state)
+
+    if buffer.num_envs is None:
+        buffer.num_envs = num_envs
+        buffer.capacity -= buffer.capacity % num_envs
+    elif num_envs != buffer.num_envs:
+        raise ValueError(f"Block of {num_envs} transitions, the buffer holds blocks of {buffer.num_envs}")
+
+    return state, action_idx, reward, next_state, done
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions in compact storage: float32 states, int32 action indices, float32 rewards and done
+    flags. Transitions are added in blocks of one per environment, slot = block start + environment, and the next state
+    of a transition is the state of the same environment in the following block, so every state is stored once.
+    The next states of the last block are written ahead into the following block, which is not sampled until its
+    transitions are added. When the state of an environment does not continue its previous next state (new episode),
+    the previous transition lost its next state and is no longer sampled, unless it is done and does not bootstrap.
+    With memmap_dir the arrays are memory-mapped files, for capacities beyond the available memory.
+    """
+    def __init__(self, capacity, state_space, seed=None, memmap_dir=None):
+        """
+        :param capacity: maximum number of stored states, rounded down to a multiple of the number of environments
+        :param state_space: size of a state
+        :param seed: seed of the sampling generator
+        :param memmap_dir: directory of the memory-mapped arrays, in memory if None
+        """
+        self.capacity = capacity
+        self.state_space = state_space
+        self.rng = np.random.default_rng(seed)
+        self.memmap_dir = memmap_dir
+        if memmap_dir is not None:
+            os.makedirs(memmap_dir, exist_ok=True)
+
+        self.states = self.allocate('states', (capacity, state_space), np.float32)
+        self.actions = self.allocate('actions', (capacity,), np.int32)
+        self.rewards = self.allocate('rewards', (capacity,), np.float32)
+        self.dones = self.allocate('dones', (capacity,), np.bool_)
+        self.valid = self.allocate('valid', (capacity,), np.bool_)
+
+        # Number of environments per block, set by the first add
+        self.num_envs = None
+        self.pos = 0
+        self.size = 0
+
+        # Sample batches, reused by every call of sample
+        self.batch_size = None
+        self.batch = None
+        self.weights = None
+
+    def allocate(self, name, shape, dtype):
+        if self.memmap_dir is None:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.memmap(os.path.join(self.memmap_dir, f"{name}.dat"), dtype=dtype, mode='w+', shape=shape)
+
+    def __len__(self):
+        """
+        Number of transitions that can be sampled
+        """
+        return int(np.count_nonzero(self.valid[:self.size]))
+
+    def add(self, state, action_idx, reward, next_state, done):
+        """
+        Add one transition, or a block of transitions with a leading (num_envs,) axis from vectorized environments
+        """
+        state, action_idx, reward, next_state, done = get_block(self, state, action_idx, reward, next_state, done)
+        num_envs = self.num_envs
+
+        block = slice(self.pos, self.pos + num_envs)
+        if self.size:
+            # Transitions of the previous block whose next state is overwritten by the first state of a new episode
+            previous = slice((self.pos - num_envs) % self.capacity, (self.pos - num_envs) % self.capacity + num_envs)
+            continued = (self.states[block] == state).all(axis=1)
+            self.valid[previous] &= continued | self.dones[previous]
+
+        self.states[block] = state
+        self.actions[block] = action_idx
+        self.rewards[block] = reward
+        self.dones[block] = done
+        self.valid[block] = True
+
+        # Next states written ahead into the following block
+        self.pos = (self.pos + num_envs) % self.capacity
+        ahead = slice(self.pos, self.pos + num_envs)
+        self.states[ahead] = next_state
+        self.valid[ahead] = False
+        self.size = max(self.size, ahead.stop)
+
+    def sample(self, batch_size):
+        """
+        Uniform sample of stored transitions, gathered into contiguous batch arrays reused by the next call
+        :return: (batch_size, state_space) states, (batch_size,) action indices, rewards and done flags,
+        (batch_size, state_space) next states, (batch_size,) importance-sampling weights (ones) and slots of the
+        transitions
+        """
+        self.allocate_batch(batch_size)
+
+        idx = self.rng.integers(self.size, size=batch_size)
+        idx = self.redraw_invalid(idx, lambda size: self.rng.integers(self.size, size=size))
+
+        # Sorted slots read memory-mapped storage in file order
+        idx.sort()
+
+        return self.gather(idx) + (self.weights, idx)
+
+    def allocate_batch(self, batch_size):
+        if batch_size == self.batch_size:
+            return
+
+        self.batch_size = batch_size
+        states_shape = (batch_size, self.state_space)
+        self.batch = (np.empty(states_shape, dtype=np.float32), np.empty(batch_size, dtype=np.int32),
+                      np.empty(batch_size, dtype=np.float32), np.empty(batch_size, dtype=np.bool_),
+                      np.empty(states_shape, dtype=np.float32))
+        self.weights = np.ones(batch_size, dtype=np.float32)
+
+    def redraw_invalid(self, idx, draw):
+        """
+        Replace the slots that cannot be sampled with new draws
+        :param draw: function of the number of slots returning new slots
+        """
+        invalid = ~self.valid[idx]
+        while invalid.any():
+            idx[invalid] = draw(np.count_nonzero(invalid))
+            invalid = ~self.valid[idx]
+
+        return idx
+
+    def update_priorities(self, idx, td_error):
+        """
+        Uniform sampling does not use priorities
+        """
+        pass
+
+    def gather(self, idx):
+        """
+        :return: transitions of the given slots, gathered into the batch arrays
+        """
+        states, actions, rewards, dones, next_states = self.batch
+        np.take(self.states, idx, axis=0, out=states)
+        np.take(self.actions, idx, out=actions)
+        np.take(self.rewards, idx, out=rewards)
+        np.take(self.dones, idx, out=dones)
+        np.take(self.states, (idx + self.num_envs) % self.capacity, axis=0, out=next_states)
+
+        return states, actions, rewards, dones, next_states
+
+
+class SumTree:
+    """
+    Binary tree of sums over a flat array, leaves hold the priorities of the slots and every node the sum of its
+    children, the root at index 1 holds the total. Batches of slots are found and updated level by level, one
+    vectorized operation per level, O(log capacity) per batch.
+    """
+    def __init__(self, capacity, tree=None):
+        """
+        :param tree: (2 * num_leaves,) float64 array of the tree, zeros, a new one if None
+        """
+        self.num_leaves = 1 << max(int(capacity - 1).bit_length(), 0)
+        self.depth = self.num_leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.num_leaves) if tree is None else tree
+
+    @staticmethod
+    def get_size(capacity):
+        """
+        :return: size of the flat array of a tree of the given capacity
+        """
+        return 2 << max(int(capacity - 1).bit_length(), 0)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def get(self, idx):
+        return self.tree[self.num_leaves + idx]
+
+    def update(self, idx, priorities):
+        """
+        Set the priorities of the given slots and the sums above them, repeated slots keep their last priority
+        """
+        node = self.num_leaves + np.asarray(idx)
+        self.tree[node] = priorities
+
+        # Parents of sorted nodes are sorted, repeated ones are dropped by comparing neighbours
+        node = np.unique(node)
+        for _ in range(self.depth):
+            node = node >> 1
+            node = node[np.append(True, node[1:] != node[:-1])]
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+
+    def find(self, values):
+        """
+        :param values: (batch_size,) prefix sums within [0, total)
+        :return: (batch_size,) slots whose cumulated priority range contains the values
+        """
+        node = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        for _ in range(self.depth):
+            left = 2 * node
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values -= np.where(go_right, left_sum, 0)
+            node = left + go_right
+
+        return np.minimum(node - self.num_leaves, self.num_leaves - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer sampling transitions in proportion to priority ** alpha, with a sum tree over the priorities.
+    New transitions get the largest priority seen so far, sampled ones the absolute TD error of their last update.
+    Slots that cannot be sampled have priority zero. The importance-sampling weights (N * P(i)) ** -beta correct the
+    bias of the sampling, they are normalized by the largest weight of the batch and beta is annealed linearly to 1.
+    """
+    def __init__(self, capacity, state_space, seed=None, memmap_dir=None, alpha=0.6, beta=0.4, beta_steps=int(1e5),
+                 eps=1e-6):
+        """
+        :param alpha: exponent of the priorities, 0 for uniform sampling
+        :param beta: initial exponent of the importance-sampling weights
+        :param beta_steps: number of samples over which beta is annealed to 1
+        :param eps: added to the absolute TD errors so that no sampled transition gets priority zero
+        """
+        super().__init__(capacity, state_space, seed=seed, memmap_dir=memmap_dir)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1 - beta) / beta_steps
+        self.eps = eps
+        self.max_priority = 1.0
+
+        self.sum_tree = SumTree(capacity, self.allocate('sum_tree', (SumTree.get_size(capacity),), np.float64))
+
+    def add(self, state, action_idx, reward, next_state, done):
+        super().add(state, action_idx, reward, next_state, done)
+
+        # Blocks whose validity changed: the previous one, the added one and the one written ahead
+        num_envs = self.num_envs
+        idx = (self.pos + np.arange(-2 * num_envs, num_envs)) % self.capacity
+        priorities = np.where(self.valid[idx], self.sum_tree.get(idx), 0)
+        priorities[num_envs:2 * num_envs] = self.max_priority ** self.alpha
+        self.sum_tree.update(idx, priorities)
+
+    def sample(self, batch_size):
+        """
+        Stratified sample of stored transitions in proportion to their priorities
+        :return: same as ReplayBuffer.sample, with the importance-sampling weights of the transitions
+        """
+        self.allocate_batch(batch_size)
+
+        # One uniform draw within each of batch_size equal ranges of the total priority
+        total = self.sum_tree.total
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        idx = self.sum_tree.find(values)
+        idx = self.redraw_invalid(idx, lambda size: self.sum_tree.find(self.rng.random(size) * total))
+        idx.sort()
+
+        # The number of transitions and the total cancel out in the normalized weights
+        weights = self.sum_tree.get(idx) ** -self.beta
+        np.divide(weights, weights.max(), out=self.weights)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return self.gather(idx) + (self.weights, idx)
+
+    def update_priorities(self, idx, td_error):
+        """
+        :param idx: (batch_size,) slots of the sampled transitions
+        :param td_error: (batch_size,) TD errors of their last update
+        """
+        priorities = np.abs(td_error) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+        # Slots invalidated since they were sampled keep priority zero
+        self.sum_tree.update(idx, np.where(self.valid[idx], priorities ** self.alpha, 0))
@@ -0,0 +1,80 @@
+# -- Public Imports
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+# -- Private Imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import *
+from constants import *
+from environment import ORANSimEnv
+from parallel_env import ParallelORANEnv
+
+# -- Global Variables
+
+
+# -- Functions
+
+def bench_single(num_steps):
+    """
+    Steps/sec of one in-process ORANSimEnv
+    """
+    env = ORANSimEnv()
+    env.reset()
+    actions = np.random.random((num_steps, NUM_GNB)) < 0.8
+
+    with open(os.devnull, 'w') as f, contextlib.redirect_stdout(f):
+        start = time.perf_counter()
+        for action in actions:
+            env.step(action)
+        elapsed = time.perf_counter() - start
+
+    return num_steps / elapsed
+
+
+def bench_pool(num_workers, num_steps, mode):
+    """
+    Env steps/sec of a ParallelORANEnv, synchronous or asynchronous stepping
+    """
+    env = ParallelORANEnv(num_workers)
+    env.reset()
+    actions = np.random.random((num_workers, NUM_GNB)) < 0.8
+
+    start = time.perf_counter()
+    if mode == 'sync':
+        for _ in range(num_steps):
+            env.step(actions)
+    else:
+        # Restart every worker as soon as it finished, until each did num_steps
+        env.step_async(actions)
+        num_done = np.zeros(num_workers, dtype=np.int64)
+        while num_done.min() < num_steps:
+            env_idx = env.ready()
+            env.step_wait(env_idx)
+            num_done[env_idx] += 1
+            env_idx = env_idx[num_done[env_idx] < num_steps]
+            if len(env_idx):
+                env.step_async(actions[env_idx], env_idx)
+    elapsed = time.perf_counter() - start
+
+    env.close()
+
+    return num_workers * num_steps / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ParallelORANEnv throughput benchmark")
+    parser.add_argument('--num_steps', type=int, default=200, help='Steps per worker')
+    parser.add_argument('--max_workers', type=int, default=os.cpu_count(), help='Largest number of workers')
+    parser.add_argument('--mode', type=str, default='sync', choices=['sync', 'async'])
+    args = parser.parse_args()
+
+    print(f"in-process ORANSimEnv: {bench_single(args.num_steps):.1f} steps/sec")
+
+    num_workers = 1
+    while num_workers <= args.max_workers:
+        steps_per_sec = bench_pool(num_workers, args.num_steps, args.mode)
+        print(f"{num_workers:3d} workers ({args.mode}): {steps_per_sec:.1f} steps/sec")
+        num_workers *= 2
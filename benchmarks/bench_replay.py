@@ -0,0 +1,83 @@
+# -- Public Imports
+import os
+import sys
+import argparse
+
+# -- Private Imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import *
+from constants import *
+from bench_suite import get_latency
+from agents.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+
+# -- Global Variables
+
+
+# -- Functions
+
+def bench_replay(buffer_class, capacity, state_space, num_envs, batch_size, num_repeats):
+    """
+    Latency of sample and of sample followed by the priority update of the sampled transitions, on a full buffer
+    """
+    buffer = buffer_class(capacity, state_space, seed=0)
+    rng = np.random.default_rng(0)
+    states = rng.random((num_envs, state_space), dtype=np.float32)
+    action_idx = rng.integers(2 ** NUM_GNB, size=num_envs)
+    dones = np.zeros(num_envs, dtype=bool)
+    for _ in range(capacity // num_envs):
+        buffer.add(states, action_idx, rng.random(num_envs), states, dones)
+
+    def sample_update():
+        *_, idx = buffer.sample(batch_size)
+        buffer.update_priorities(idx, rng.normal(size=batch_size))
+
+    return get_latency(lambda: buffer.sample(batch_size), num_repeats), get_latency(sample_update, num_repeats)
+
+
+def bench_updates(graph_replay, capacity, state_space, num_envs, batch_size, num_repeats):
+    """
+    Gradient steps per second of BaseAgentDQN.update, sampling on the host or in-graph
+    """
+    import contextlib
+    from agents.dqn import BaseAgentDQN
+
+    config = argparse.Namespace(state_space=state_space, action_space=2 ** NUM_GNB, agent='dqn', batch_size=batch_size,
+                                buffer_capacity=capacity, graph_replay=graph_replay, epsilon=1.0, epsilon_min=0.01,
+                                epsilon_decay=0.9999, gamma=0.99, dqn_lr=1e-3, seed=0)
+    with open(os.devnull, 'w') as f, contextlib.redirect_stdout(f):
+        agent = BaseAgentDQN(config)
+
+    rng = np.random.default_rng(0)
+    states = rng.random((num_envs, state_space), dtype=np.float32)
+    transitions = (states, rng.integers(config.action_space, size=num_envs), rng.random(num_envs), states,
+                   np.zeros(num_envs, dtype=bool))
+    for _ in range(100):
+        agent.record(transitions)
+    agent.update()
+
+    return 1e3 / get_latency(agent.update, num_repeats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Uniform and prioritized replay sampling latency benchmark")
+    parser.add_argument('--capacities', type=int, nargs='+', default=[int(1e5), int(1e6)])
+    parser.add_argument('--state_space', type=int, default=50)
+    parser.add_argument('--num_envs', type=int, default=8, help='Transitions per add')
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--num_repeats', type=int, default=200, help='Timed calls of each operation')
+    parser.add_argument('--updates', action='store_true',
+                        help='Also measure the gradient steps per second of the agent with host and in-graph sampling')
+    args = parser.parse_args()
+
+    for capacity in args.capacities:
+        for buffer_class in (ReplayBuffer, PrioritizedReplayBuffer):
+            latency_sample, latency_sample_update = bench_replay(buffer_class, capacity, args.state_space,
+                                                                 args.num_envs, args.batch_size, args.num_repeats)
+            print(f"{buffer_class.__name__:24s} capacity {capacity:.0e}: sample {latency_sample:.3f} ms, "
+                  f"sample + update {latency_sample_update:.3f} ms")
+
+    if args.updates:
+        for graph_replay in (False, True):
+            steps_per_sec = bench_updates(graph_replay, args.capacities[0], args.state_space, args.num_envs,
+                                          args.batch_size, args.num_repeats)
+            print(f"{'in-graph' if graph_replay else 'host':8s} sampling: {steps_per_sec:.1f} gradient steps/sec")
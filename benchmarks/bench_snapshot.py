@@ -0,0 +1,92 @@
+# -- Public Imports
+import os
+import sys
+import copy
+import json
+import argparse
+import tempfile
+
+# -- Private Imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import *
+from constants import *
+from bench_suite import get_latency
+from environment import ORANSimEnv, VectorORANEnv
+from scenario_trace import TraceRecorder
+
+# -- Global Variables
+
+
+# -- Functions
+
+def bench_snapshot(num_envs, num_steps, num_repeats):
+    """
+    Latency of snapshot (new blob and reused blob), restore and copy.deepcopy of the simulator after num_steps steps
+    """
+    env = VectorORANEnv(num_envs)
+    env.reset()
+    num_gnbs = env.oran.num_gnbs
+    for _ in range(num_steps):
+        env.step(np.random.random((num_envs, num_gnbs)) < 0.8)
+
+    blob = env.snapshot()
+    latency_snapshot = get_latency(lambda: env.snapshot(), num_repeats)
+    latency_snapshot_out = get_latency(lambda: env.snapshot(blob), num_repeats)
+    latency_restore = get_latency(lambda: env.restore(blob), num_repeats)
+    latency_deepcopy = get_latency(lambda: copy.deepcopy(env.oran), max(num_repeats // 10, 1))
+
+    return blob.nbytes, latency_snapshot, latency_snapshot_out, latency_restore, latency_deepcopy
+
+
+def check_trace_round_trip(num_steps, num_steps_after, chunk_steps=4):
+    """
+    Snapshot an environment recording a scenario trace and one replaying it after num_steps steps, step
+    num_steps_after more, restore and step again. Both runs must give the same rewards, and the recorded episode must
+    hold every step once.
+    """
+    with tempfile.TemporaryDirectory() as path:
+        for option in ('trace_record', 'trace_replay'):
+            env = ORANSimEnv(argparse.Namespace(seed=0, **{option: path}))
+            if option == 'trace_record':
+                # Small chunks, so that the snapshot falls within a chunk and the restore crosses chunk files
+                env.trace = TraceRecorder(path, chunk_steps=chunk_steps)
+            actions = np.random.default_rng(0).random((num_steps + num_steps_after, env.oran.num_gnbs)) < 0.8
+            env.reset()
+            for action in actions[:num_steps]:
+                env.step(action)
+
+            blob = env.snapshot()
+            runs = []
+            for _ in range(2):
+                env.restore(blob)
+                runs.append([env.step(action)[1] for action in actions[num_steps:]])
+            env.close()
+            if not np.array_equal(*runs):
+                raise AssertionError(f"Rewards after a restore differ with {option}: {runs[0]} and {runs[1]}")
+
+            if option == 'trace_record':
+                with open(os.path.join(path, 'meta.json')) as f:
+                    recorded = json.load(f)['num_steps']
+                if recorded != [num_steps + num_steps_after]:
+                    raise AssertionError(f"Recorded episode has {recorded} steps, expected "
+                                         f"{num_steps + num_steps_after}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulator snapshot/restore latency benchmark")
+    parser.add_argument('--num_steps', type=int, default=20, help='Steps before the snapshot')
+    parser.add_argument('--num_repeats', type=int, default=100, help='Timed calls of each operation')
+    parser.add_argument('--max_envs', type=int, default=16, help='Largest number of environments')
+    args = parser.parse_args()
+
+    check_trace_round_trip(10, 5)
+    print("Snapshot round trip with scenario traces: identical rewards")
+
+    num_envs = 1
+    while num_envs <= args.max_envs:
+        size, latency_snapshot, latency_snapshot_out, latency_restore, latency_deepcopy = \
+            bench_snapshot(num_envs, args.num_steps, args.num_repeats)
+        print(f"{num_envs:3d} envs, {size / 1e6:.2f} MB: snapshot {latency_snapshot:.3f} ms "
+              f"({latency_snapshot_out:.3f} ms reused), restore {latency_restore:.3f} ms, "
+              f"deepcopy {latency_deepcopy:.3f} ms")
+        num_envs *= 2
@@ -0,0 +1,359 @@
+# -- Public Imports
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import contextlib
+
+# -- Private Imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import *
+from constants import *
+
+# -- Global Variables
+
+# Phases of ORAN.update_system timed in place, in the order they run
+ORAN_PHASES = ('recycle_rbs', 'allocate_rbs', 'update_active_status', 'move_ues', 'update_traffic', 'update_sinr',
+               'update_delay', 'perform_handover')
+
+# Parameter grid of every benchmark group, quick grids keep the smallest and largest values
+GRIDS = dict(
+    oran=dict(num_ues_per_gnb=(3, 9, 27), num_rings=(1, 2, 3)),
+    env=dict(num_ues_per_gnb=(3, 9, 27), num_rings=(1, 2, 3)),
+    agent=dict(batch_size=(32, 128, 512), num_rings=(1,)),
+    tti=dict(rb_grid=('shared', 'per_cell'), num_rings=(1, 2, 3)),
+)
+
+# Largest ratio of the median ORAN.update_system time with TTI-level scheduling to the one with coarse scheduling
+TTI_SLOWDOWN_BUDGET = 5
+
+# Relative slowdown of the median flagged as a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+# -- Functions
+
+def get_times(function, num_repeats, num_warmup=2):
+    """
+    :return: (num_repeats,) wall times of the calls of function (sec), after num_warmup untimed calls
+    """
+    for _ in range(num_warmup):
+        function()
+
+    times = np.zeros(num_repeats)
+    for idx in range(num_repeats):
+        start = time.perf_counter()
+        function()
+        times[idx] = time.perf_counter() - start
+
+    return times
+
+
+def get_stats(times):
+    """
+    :return: summary of call times in milliseconds
+    """
+    times = np.asarray(times) * 1e3
+
+    return dict(median_ms=float(np.median(times)), mean_ms=float(np.mean(times)), min_ms=float(np.min(times)),
+                std_ms=float(np.std(times)), num_repeats=len(times))
+
+
+def get_latency(function, num_repeats):
+    """
+    :return: mean wall time of the calls of function (ms), after the warmup calls of get_times
+    """
+    return float(np.mean(get_times(function, num_repeats))) * 1e3
+
+
+def get_sim_config(num_ues_per_gnb, num_rings, **kwargs):
+
+    return argparse.Namespace(num_ues_per_gnb=num_ues_per_gnb, num_rings=num_rings, seed=0, **kwargs)
+
+
+def get_agent_config(num_rings, batch_size):
+    from topology import get_num_cells
+    from oran import NUM_STATE_GNB, NUM_STATE_GLOBAL
+
+    num_gnbs = get_num_cells(num_rings)
+
+    # Greedy agent, so that act times the forward pass rather than random exploration
+    return argparse.Namespace(state_space=num_gnbs * NUM_STATE_GNB + NUM_STATE_GLOBAL, action_space=2 ** num_gnbs,
+                              agent='dqn', batch_size=batch_size, buffer_capacity=int(1e4), epsilon=0.0,
+                              epsilon_min=0.0, epsilon_decay=0.9999, gamma=0.99, dqn_lr=1e-3, seed=0)
+
+
+def bench_oran(num_ues_per_gnb, num_rings, num_repeats):
+    """
+    ORAN.update_system and its phases, timed in place by wrapping the bound methods of the instance, then the state
+    and reward builders
+    """
+    from oran import ORAN
+
+    oran = ORAN(get_sim_config(num_ues_per_gnb, num_rings))
+    rng = np.random.default_rng(0)
+    actions = rng.random((num_repeats + 2, oran.num_gnbs)) < 0.8
+
+    phase_times = {name: [] for name in ORAN_PHASES}
+    for name in ORAN_PHASES:
+        method = getattr(oran, name)
+
+        def timed(*args, _method=method, _times=phase_times[name], **kwargs):
+            start = time.perf_counter()
+            result = _method(*args, **kwargs)
+            _times.append(time.perf_counter() - start)
+            return result
+
+        setattr(oran, name, timed)
+
+    steps = itertools.count()
+
+    def update_system():
+        step = next(steps)
+        oran.update_system(step * TIME_STEP, actions[step])
+
+    step_times = get_times(update_system, num_repeats)
+
+    results = {'update_system': get_stats(step_times)}
+    for name, times in phase_times.items():
+        if times:
+            results[name] = get_stats(times[-num_repeats:])
+
+    def get_state_oran():
+        oran.kpms_dirty = True
+        oran.get_state_oran()
+
+    def get_sum_reward():
+        oran.kpms_dirty = True
+        oran.get_sum_reward()
+
+    results['get_state_oran'] = get_stats(get_times(get_state_oran, num_repeats))
+    results['get_sum_reward'] = get_stats(get_times(get_sum_reward, num_repeats))
+
+    return results
+
+
+def bench_env(num_ues_per_gnb, num_rings, num_repeats):
+    """
+    ORANSimEnv.step and ORANSimEnv.reset
+    """
+    from environment import ORANSimEnv
+
+    env = ORANSimEnv(get_sim_config(num_ues_per_gnb, num_rings))
+    env.reset()
+    rng = np.random.default_rng(0)
+    num_gnbs = env.oran.num_gnbs
+
+    results = {'ORANSimEnv.step': get_stats(get_times(lambda: env.step(rng.random(num_gnbs) < 0.8), num_repeats))}
+    results['ORANSimEnv.reset'] = get_stats(get_times(env.reset, max(num_repeats // 10, 3)))
+
+    return results
+
+
+def bench_agent(batch_size, num_rings, num_repeats):
+    """
+    Greedy BaseAgentDQN.act on a batch of states, record of a batch of transitions, sample and update
+    """
+    from agents.dqn import BaseAgentDQN
+    from oran import STATE_DTYPE
+
+    config = get_agent_config(num_rings, batch_size)
+    with open(os.devnull, 'w') as f, contextlib.redirect_stdout(f):
+        agent = BaseAgentDQN(config)
+
+    rng = np.random.default_rng(0)
+    states = rng.random((batch_size, config.state_space), dtype=STATE_DTYPE)
+    action_idx = rng.integers(config.action_space, size=batch_size)
+    rewards = rng.random(batch_size)
+    transitions = (states, action_idx, rewards, states, np.zeros(batch_size, dtype=bool))
+
+    # Fill the buffer so sampling draws from a full capacity
+    for _ in range(-(-agent.buffer.capacity // batch_size)):
+        agent.record(transitions)
+
+    return {
+        'BaseAgentDQN.act': get_stats(get_times(lambda: agent.act(states), num_repeats)),
+        'BaseAgentDQN.record': get_stats(get_times(lambda: agent.record(transitions), num_repeats)),
+        'BaseAgentDQN.sample': get_stats(get_times(agent.sample, num_repeats)),
+        'BaseAgentDQN.update': get_stats(get_times(agent.update, num_repeats)),
+    }
+
+
+def bench_tti(rb_grid, num_rings, num_repeats, num_ues_per_gnb=9):
+    """
+    ORAN.update_system with coarse and TTI-level scheduling on the same scenario and actions, and the slowdown of the
+    TTI-level step over the coarse one
+    """
+    from oran import ORAN
+
+    results = {}
+    for tti_mode in (False, True):
+        oran = ORAN(get_sim_config(num_ues_per_gnb, num_rings, tti_mode=tti_mode, rb_grid=rb_grid))
+        actions = np.random.default_rng(0).random((num_repeats + 2, oran.num_gnbs)) < 0.8
+        steps = itertools.count()
+
+        def update_system():
+            step = next(steps)
+            oran.update_system(step * TIME_STEP, actions[step])
+
+        name = 'ORAN.update_system[tti]' if tti_mode else 'ORAN.update_system[coarse]'
+        results[name] = get_stats(get_times(update_system, num_repeats))
+
+    # Checked against TTI_SLOWDOWN_BUDGET by compare
+    results['ORAN.update_system[tti]']['slowdown'] = \
+        results['ORAN.update_system[tti]']['median_ms'] / results['ORAN.update_system[coarse]']['median_ms']
+
+    return results
+
+
+BENCHMARKS = dict(oran=bench_oran, env=bench_env, agent=bench_agent, tti=bench_tti)
+
+
+def run(groups, num_repeats, quick=False):
+    """
+    Run the benchmarks of the given groups over their parameter grids
+    :return: list of records (name, params and timing statistics)
+    """
+    records = []
+    for group in groups:
+        grid = GRIDS[group]
+        if quick:
+            grid = {key: tuple(sorted({values[0], values[-1]})) for key, values in grid.items()}
+
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid, values))
+            for name, stats in BENCHMARKS[group](num_repeats=num_repeats, **params).items():
+                records.append(dict(name=name, group=group, params=params, **stats))
+                slowdown = f" (slowdown x{stats['slowdown']:.2f})" if 'slowdown' in stats else ''
+                print(f"{name:24s} {get_params_label(params):36s} {stats['median_ms']:10.3f} ms{slowdown}")
+
+    return records
+
+
+def get_params_label(params):
+
+    return ' '.join(f"{key}={value}" for key, value in sorted(params.items()))
+
+
+def get_key(record):
+
+    return record['name'], get_params_label(record['params'])
+
+
+def save(records, file_path):
+    """
+    Store the records with the environment they were measured in
+    """
+    tf = sys.modules.get('tensorflow')
+    meta = dict(time=time.strftime('%Y-%m-%d %H:%M:%S'), python=platform.python_version(), numpy=np.__version__,
+                tensorflow=tf.__version__ if tf else None, machine=platform.machine(),
+                processor=platform.processor(), cpu_count=os.cpu_count())
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, 'w') as f:
+        json.dump(dict(meta=meta, results=records), f, indent=1)
+
+
+def load(file_path):
+    with open(file_path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the medians of the benchmarks present in both result lists, and check the slowdowns of the current
+    results against their budget
+    :return: list of (key, baseline, current, ratio) of the regressions, in ms for the medians
+    """
+    baseline = {get_key(record): record for record in baseline}
+    regressions = []
+    for record in current:
+        key = get_key(record)
+        if 'slowdown' in record:
+            flag = 'REGRESSION' if record['slowdown'] > TTI_SLOWDOWN_BUDGET else ''
+            print(f"{key[0]:24s} {key[1]:36s} slowdown x{record['slowdown']:5.2f} "
+                  f"(budget x{TTI_SLOWDOWN_BUDGET}) {flag}")
+            if flag:
+                regressions.append((key, TTI_SLOWDOWN_BUDGET, record['slowdown'],
+                                    record['slowdown'] / TTI_SLOWDOWN_BUDGET))
+
+        if key not in baseline:
+            continue
+
+        base_ms, current_ms = baseline[key]['median_ms'], record['median_ms']
+        ratio = current_ms / base_ms
+        flag = 'REGRESSION' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+        print(f"{key[0]:24s} {key[1]:36s} {base_ms:10.3f} -> {current_ms:10.3f} ms  x{ratio:5.2f} {flag}")
+        if ratio > 1 + threshold:
+            regressions.append((key, base_ms, current_ms, ratio))
+
+    return regressions
+
+
+def plot(records, plot_dir):
+    """
+    Scaling curves of every benchmark: median time against each parameter, one line per value of the others
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    os.makedirs(plot_dir, exist_ok=True)
+    for name in sorted({record['name'] for record in records}):
+        name_records = [record for record in records if record['name'] == name]
+        for param in name_records[0]['params']:
+            fig, ax = plt.subplots()
+            curves = {}
+            for record in name_records:
+                others = {key: value for key, value in record['params'].items() if key != param}
+                curves.setdefault(get_params_label(others), []).append((record['params'][param], record['median_ms']))
+            for label, points in sorted(curves.items()):
+                points.sort()
+                ax.plot(*zip(*points), marker='o', label=label)
+            ax.set_xlabel(param)
+            ax.set_ylabel('median time (ms)')
+            ax.set_title(name)
+            ax.legend(fontsize='small')
+            fig.savefig(os.path.join(plot_dir, f"{name.replace('.', '_')}_{param}.png"), bbox_inches='tight')
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulator and agent benchmark suite")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and store the results as JSON')
+    run_parser.add_argument('--groups', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    run_parser.add_argument('--num_repeats', type=int, default=30, help='Timed calls of every benchmark')
+    run_parser.add_argument('--quick', action='store_true', help='Only the smallest and largest parameter values')
+    run_parser.add_argument('--output', type=str, default='benchmarks/results/latest.json')
+    run_parser.add_argument('--plot_dir', type=str, default=None, help='Directory of the scaling curves')
+
+    compare_parser = subparsers.add_parser('compare', help='Flag regressions against a baseline')
+    compare_parser.add_argument('baseline', type=str, help='JSON results of the baseline')
+    compare_parser.add_argument('current', type=str, help='JSON results to check')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help='Relative slowdown of the median flagged as a regression')
+
+    plot_parser = subparsers.add_parser('plot', help='Plot the scaling curves of stored results')
+    plot_parser.add_argument('results', type=str, help='JSON results')
+    plot_parser.add_argument('--plot_dir', type=str, default='plots/benchmarks')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        records = run(args.groups, args.num_repeats, args.quick)
+        save(records, args.output)
+        print(f"Results saved to {args.output}")
+        if args.plot_dir:
+            plot(records, args.plot_dir)
+
+    elif args.command == 'compare':
+        regressions = compare(load(args.baseline), load(args.current), args.threshold)
+        print(f"{len(regressions)} regression(s), medians above {args.threshold:.0%} or slowdowns above their budget")
+        sys.exit(1 if regressions else 0)
+
+    else:
+        plot(load(args.results), args.plot_dir)
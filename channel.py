@@ -0,0 +1,146 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+# Distance independent part of the path loss (dB)
+PATH_LOSS_CONST = 20 * np.log10(CENTER_FREQ / 1e9) + 20 * np.log10((4 * np.pi) / (3e8))
+
+# Noise power in watts
+POWER_NOISE = BANDWIDTH_PER_RB * NOISE_POWER_DENSITY
+
+
+# -- Functions
+
+def get_path_loss(distance, shadowing=0):
+    """
+    Path loss (dB) with log-normal shadowing
+    :param distance: array of distances in meters
+    :param shadowing: shadowing in dB, broadcast against distance
+    :return:
+    """
+    # path_loss = 28.0 + 40.0 * np.log10(distance) + 20 * np.log10(CENTER_FREQ / 1e9)
+    path_loss = 20 * np.log10(distance) + PATH_LOSS_CONST
+
+    return path_loss + shadowing
+
+
+def dbm_to_watt(power_dbm):
+
+    return 10 ** ((power_dbm - 30) / 10)
+
+
+class ChannelModel:
+    """
+    UE x gNB channel engine.
+    Distance, path loss, received power and SINR are computed for every (UE, gNB) pair of every environment once
+    per step with broadcasting, all consumers (state, handover, scheduler) read the stored matrices.
+    Shadowing is read from the precomputed maps at the UE positions. With a neighbour index, only the serving gNB and
+    the gNBs within the interference radius of each UE are evaluated, the other entries of the matrices are set to
+    no signal (zero power, -inf dB).
+    """
+    def __init__(self, num_envs, num_ues, num_gnbs, shadowing, topology=None, neighbours=None):
+        """
+        :param shadowing: ShadowingMaps of the gNBs
+        :param topology: HexTopology folding the UE-gNB offsets with wrap-around, plain offsets if None
+        :param neighbours: NeighbourIndex limiting the evaluated gNBs of every UE, all gNBs if None
+        """
+        self.num_envs = num_envs
+        self.num_ues = num_ues
+        self.num_gnbs = num_gnbs
+        self.shadowing = shadowing
+        self.topology = topology
+        self.neighbours = neighbours
+
+        # (num_envs, num_ues, num_gnbs) matrices
+        shape = (num_envs, num_ues, num_gnbs)
+        self.distance = np.zeros(shape)
+        self.path_loss = np.zeros(shape)      # dB
+        self.rsrp = np.zeros(shape)           # dBm, received power of each gNB
+        self.power_rx = np.zeros(shape)       # W
+        self.sinr = np.zeros(shape)           # dB, SINR the UE would get if served by the gNB
+
+        # (num_envs, num_gnbs) gNBs contributing to the interference, as 0/1 weights
+        self.transmitting = np.zeros((num_envs, num_gnbs))
+
+        # (num_envs, num_ues) SINR from the serving gNB (dB)
+        self.sinr_serving = np.zeros((num_envs, num_ues))
+
+    def get_distance(self, ue_x, ue_y, gnb_x, gnb_y):
+        dx, dy = ue_x - gnb_x, ue_y - gnb_y
+        if self.topology is not None:
+            dx, dy = self.topology.get_offsets(dx, dy)
+
+        return np.hypot(dx, dy)
+
+    def update(self, ue_x, ue_y, gnb_x, gnb_y, power_tx, transmitting, serving_gnb):
+        """
+        Recompute all matrices for the current positions and Tx powers
+        :param ue_x, ue_y: (num_envs, num_ues) UE positions
+        :param gnb_x, gnb_y: (num_envs, num_gnbs) gNB positions
+        :param power_tx: (num_envs, num_gnbs) Tx power of gNBs (dBm)
+        :param transmitting: (num_envs, num_gnbs) boolean mask of active gNBs with non-zero power
+        :param serving_gnb: (num_envs, num_ues) index of the serving gNB of each UE
+        :return: (num_envs, num_ues) SINR from the serving gNB (dB)
+        """
+        self.transmitting[:] = transmitting
+
+        if self.neighbours is not None:
+            return self.update_neighbours(ue_x, ue_y, gnb_x, gnb_y, power_tx, serving_gnb)
+
+        self.distance[:] = self.get_distance(ue_x[..., None], ue_y[..., None], gnb_x[:, None, :], gnb_y[:, None, :])
+        self.path_loss[:] = get_path_loss(self.distance, self.shadowing.lookup(ue_x, ue_y))
+        np.subtract(power_tx[:, None, :], self.path_loss, out=self.rsrp)
+        self.power_rx[:] = dbm_to_watt(self.rsrp)
+
+        # Only transmitting gNBs interfere, the candidate serving gNB is excluded from its own interference
+        power_interference = self.power_rx * self.transmitting[:, None, :]
+        power_interference[:] = power_interference.sum(axis=2, keepdims=True) - power_interference
+        np.maximum(power_interference, 0, out=power_interference)
+        np.divide(self.power_rx, power_interference + POWER_NOISE, out=self.sinr)
+        np.log10(self.sinr, out=self.sinr)
+        self.sinr *= 10
+
+        self.sinr_serving[:] = np.take_along_axis(self.sinr, serving_gnb[..., None], axis=2)[..., 0]
+
+        return self.sinr_serving
+
+    def update_neighbours(self, ue_x, ue_y, gnb_x, gnb_y, power_tx, serving_gnb):
+        """
+        Same as update, restricted to the serving gNB and the neighbours of every UE
+        """
+        # (num_envs, num_ues, 1 + max_neighbours) evaluated gNBs, serving gNB first, -1 for padding and duplicates
+        gnb = self.neighbours.get_neighbours(ue_x, ue_y)
+        gnb = np.concatenate([serving_gnb[..., None], np.where(gnb == serving_gnb[..., None], -1, gnb)], axis=2)
+        valid = gnb >= 0
+        gnb[~valid] = 0
+        env = np.arange(self.num_envs)[:, None, None]
+
+        distance = self.get_distance(ue_x[..., None], ue_y[..., None], gnb_x[env, gnb], gnb_y[env, gnb])
+        path_loss = get_path_loss(distance, self.shadowing.lookup(ue_x, ue_y, gnb))
+        rsrp = power_tx[env, gnb] - path_loss
+        power_rx = dbm_to_watt(rsrp) * valid
+
+        power_interference = power_rx * self.transmitting[env, gnb]
+        power_interference = np.maximum(power_interference.sum(axis=2, keepdims=True) - power_interference, 0)
+        with np.errstate(divide='ignore'):
+            sinr = 10 * np.log10(power_rx / (power_interference + POWER_NOISE))
+
+        # Scatter the evaluated entries, the others have no signal
+        self.distance.fill(np.inf)
+        self.path_loss.fill(np.inf)
+        self.rsrp.fill(-np.inf)
+        self.power_rx.fill(0)
+        self.sinr.fill(-np.inf)
+        idx_env, idx_ue, idx = np.nonzero(valid)
+        idx_gnb = gnb[idx_env, idx_ue, idx]
+        for matrix, values in ((self.distance, distance), (self.path_loss, path_loss), (self.rsrp, rsrp),
+                               (self.power_rx, power_rx), (self.sinr, sinr)):
+            matrix[idx_env, idx_ue, idx_gnb] = values[idx_env, idx_ue, idx]
+
+        self.sinr_serving[:] = sinr[..., 0]
+
+        return self.sinr_serving
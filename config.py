@@ -3,6 +3,8 @@ import argparse
 
 # -- Private Imports
 from constants import *
+from oran import NUM_STATE_GNB, NUM_STATE_GLOBAL
+from topology import get_num_cells
 
 # -- Global Variables
 
@@ -23,17 +25,106 @@ def get_config():
     parser.add_argument('--epsilon', type=float, default=1.0, help='Initial exploration rate (epsilon-greedy strategy)')
     parser.add_argument('--epsilon_min', type=float, default=0.01, help='Minimum exploration rate')
     parser.add_argument('--epsilon_decay', type=float, default=0.9999, help='Decay rate for exploration rate')
-    parser.add_argument('--state_space', type=int, default=50, help='Size of the state space')
-    parser.add_argument('--action_space', type=int, default=2 ** NUM_GNB, help='Size of the action space')
+    parser.add_argument('--state_space', type=int, default=None,
+                        help='Size of the state space, derived from the number of gNBs if not set')
+    parser.add_argument('--action_space', type=int, default=None,
+                        help='Size of the action space, 2 ** number of gNBs if not set')
     parser.add_argument('--batch_size', type=int, default=256, help='Batch size for training')
+    parser.add_argument('--train_freq', type=int, default=1, help='Environment steps between training calls')
+    parser.add_argument('--gradient_steps', type=int, default=1,
+                        help='Gradient steps, each followed by the soft target update, fused in one training call')
+    parser.add_argument('--tau', type=float, default=0.001, help='Soft target update rate')
+    parser.add_argument('--jit_compile', action='store_true', help='Compile the fused training loop with XLA')
+    parser.add_argument('--log_every', type=int, default=1,
+                        help='Steps between step logs, the losses are fetched from the device only then')
+    parser.add_argument('--buffer_capacity', type=int, default=int(1e4),
+                        help='Number of transitions of the replay buffer')
+    parser.add_argument('--buffer_memmap_dir', type=str, default=None,
+                        help='Directory of memory-mapped replay buffer arrays, for capacities beyond the memory')
+    parser.add_argument('--graph_replay', action='store_true',
+                        help='Replay buffer in TensorFlow variables sampled within the compiled update step')
+    parser.add_argument('--per', action='store_true', help='Prioritized experience replay instead of uniform sampling')
+    parser.add_argument('--per_alpha', type=float, default=0.6, help='Priority exponent of prioritized replay')
+    parser.add_argument('--per_beta', type=float, default=0.4,
+                        help='Initial importance-sampling exponent of prioritized replay, annealed to 1')
+    parser.add_argument('--per_beta_steps', type=int, default=int(1e5),
+                        help='Number of updates over which the importance-sampling exponent is annealed to 1')
     parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducibility')
 
+    # Simulator options
+    parser.add_argument('--num_rings', type=int, default=NUM_RINGS,
+                        help='Number of hexagonal rings of gNBs around the centre gNB (1: 7, 2: 19, 3: 37, 5: 91 gNBs)')
+    parser.add_argument('--wrap_around', action='store_true', help='Use wrap-around distances between UEs and gNBs')
+    parser.add_argument('--num_ues_per_gnb', type=int, default=NUM_UES_PER_GNB, help='Number of UEs per gNB')
+    parser.add_argument('--mobility', type=str, default='random_walk',
+                        choices=['random_walk', 'random_waypoint', 'gauss_markov'],
+                        help='Mobility model of the UE tracks generated for every episode')
+    parser.add_argument('--mobility_boundary', type=str, default='reflect', choices=['reflect', 'none'],
+                        help='Reflect the UE tracks at the boundary of the cells, or let UEs leave the area')
+    parser.add_argument('--interference_radius', type=float, default=None,
+                        help='Only gNBs within this radius of a UE interfere (m), all gNBs if not set')
+    parser.add_argument('--tti_mode', action='store_true',
+                        help='Run scheduling, buffers and delays every TTI within each agent step')
+    parser.add_argument('--rb_grid', type=str, default='shared', choices=['shared', 'per_cell'],
+                        help='RB grid: one pool of NUM_RBS shared by all gNBs, or NUM_RBS per gNB')
+    parser.add_argument('--ho_hysteresis', type=float, default=HO_HYSTERESIS, help='Handover hysteresis (dB)')
+    parser.add_argument('--ho_ttt', type=float, default=HO_TTT, help='Handover time-to-trigger at zero margin (sec)')
+    parser.add_argument('--ho_ttt_margin', type=float, default=HO_TTT_MARGIN,
+                        help='Handover margin above which the time-to-trigger is zero (dB)')
+    parser.add_argument('--shadowing_decorrelation', type=float, default=SHADOWING_DECORRELATION,
+                        help='Decorrelation distance of the shadowing maps (m)')
+    parser.add_argument('--shadowing_cache', type=str, default=None,
+                        help='.npy file the shadowing maps are loaded from, generated and saved if missing')
+    parser.add_argument('--trace_record', type=str, default=None,
+                        help='Directory the scenario trace (UE positions, traffic, shadowing) is recorded to, '
+                             'with --env sim or pool')
+    parser.add_argument('--trace_replay', type=str, default=None,
+                        help='Directory of a recorded scenario trace replayed instead of sampling the scenarios, '
+                             'with --env sim or pool')
+
+    # Telemetry options
+    parser.add_argument('--telemetry_level', type=str, default='off',
+                        choices=['trace', 'debug', 'info', 'warning', 'off'],
+                        help='Minimum level of the telemetry records (trace: per-UE arrays, debug: per-gNB and events)')
+    parser.add_argument('--telemetry_sink', type=str, default='ring', choices=['ring', 'stdout', 'file'],
+                        help='Destination of the telemetry records: in-memory ring, stdout or JSON lines file')
+    parser.add_argument('--telemetry_file', type=str, default='telemetry.jsonl',
+                        help='File of the telemetry records for --telemetry_sink file')
+    parser.add_argument('--telemetry_every', type=int, default=1,
+                        help='Emit one telemetry record out of telemetry_every per event')
+
+    # Profiling options
+    parser.add_argument('--profile', action='store_true',
+                        help='Time the simulator phases and training loop stages, reported per step in the env info '
+                             'and per episode in the metrics')
+
     # Add environment and agent arguments with restricted choices
-    parser.add_argument('--env', type=str, default='sim', choices=['sim', 'testbed'],
-                        help='Environment to use (sim or testbed)')
+    parser.add_argument('--env', type=str, default='sim', choices=['sim', 'vec', 'pool', 'testbed'],
+                        help='Environment to use (sim, vec for batched sim environments, pool for subprocess '
+                             'sim workers, or testbed)')
+    parser.add_argument('--num_envs', type=int, default=8,
+                        help='Number of sub-environments for --env vec or worker processes for --env pool')
     parser.add_argument('--agent', type=str, default='dqn', choices=['dqn'],
                         help='Agent to use (currently only DQN is supported)')
     # Parse the arguments
     args = parser.parse_args()
 
+    if args.graph_replay and (args.per or args.buffer_memmap_dir):
+        parser.error('--graph_replay samples uniformly from device memory, without --per or --buffer_memmap_dir')
+
+    # Traces start episodes on full resets only, the batched env resets finished sub-environments one by one
+    if (args.trace_record or args.trace_replay) and args.env not in ('sim', 'pool'):
+        parser.error('--trace_record and --trace_replay require --env sim or --env pool')
+
+    num_gnbs = get_num_cells(args.num_rings)
+    if args.state_space is None:
+        args.state_space = num_gnbs * NUM_STATE_GNB + NUM_STATE_GLOBAL
+    if args.action_space is None:
+        args.action_space = 2 ** num_gnbs
+    if args.action_space != 2 ** num_gnbs:
+        parser.error(f"--action_space must be 2 ** {num_gnbs}, one action per combination of active gNBs")
+    if args.action_space > MAX_ACTION_SPACE:
+        parser.error(f"{num_gnbs} gNBs give {args.action_space} actions, the Q-head enumerates at most "
+                     f"{MAX_ACTION_SPACE} (--num_rings {args.num_rings})")
+
     return args
\ No newline at end of file
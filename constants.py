@@ -21,9 +21,15 @@ BANDWIDTH_PER_RB = 2e5
 # PRB Efficiency (in Mbps)
 RB_EFFICIENCY = 2e6
 
-# Number of gNBs in the ORAN system
+# Number of gNBs in the ORAN system (default single-ring layout)
 NUM_GNB = 7
 
+# Largest action space of the DQN Q-head, one output per combination of active gNBs (7 gNBs: 128 outputs)
+MAX_ACTION_SPACE = 2 ** 12
+
+# Number of hexagonal rings of gNBs around the centre gNB (1 + 3 * NUM_RINGS * (NUM_RINGS + 1) gNBs)
+NUM_RINGS = 1
+
 # Number of resource blocks (RBs) available
 NUM_RBS = 100
 
@@ -45,9 +51,42 @@ NOISE_POWER_DENSITY = 3.98e-21
 # Std for shadowing (in dB)
 SHADOWING_STD = 8
 
+# Decorrelation distance of the shadowing (in meters)
+SHADOWING_DECORRELATION = 50
+
+# Grid spacing of the shadowing maps (in meters)
+SHADOWING_RESOLUTION = 20
+
 # Time Step (in Sec)
 TIME_STEP = 0.1
 
+# Traffic types supported by UEs (the index is the traffic code stored in the UE arrays)
+TRAFFIC_TYPES = ('tcp_full', 'udp_bursty', 'tcp_bursty')
+
+# Maximum delay reported for a UE without service (in Sec)
+DELAY_MAX = 10
+
+# SINR threshold below which a UE is in Radio Link Failure (in dB)
+RLF_THRESHOLD = -5
+
+# Handover hysteresis: RSRP offset of the target over the serving gNB (in dB)
+HO_HYSTERESIS = 3
+
+# Handover time-to-trigger at zero margin (in Sec)
+HO_TTT = 0.3
+
+# Handover margin above which the time-to-trigger drops to zero (in dB)
+HO_TTT_MARGIN = 10
+
+# Number of handover events kept in the event log
+HO_LOG_CAPACITY = 10000
+
+# Number of steps of the pre-generated UE mobility tracks
+MOBILITY_NUM_STEPS = 100
+
+# Number of steps per chunk file of the scenario traces
+TRACE_CHUNK_STEPS = 256
+
 # ======================
 # DRL Agent Configuration
 # ======================
@@ -2,7 +2,10 @@
 
 
 # -- Private Imports
-from oran import ORAN
+from oran import ORAN, SIM_PHASES, STATE_DTYPE
+from profiling import get_profiler
+from rng import get_seed_sequence
+from scenario_trace import open_trace
 from utils import *
 from constants import *
 
@@ -16,21 +19,48 @@ class ORANSimEnv:
     Environment class for DRL training based on the ORAN system.
     """
 
-    def __init__(self):
+    def __init__(self, config=None, seed=None):
         """
         Initialize the ORAN environment.
+        :param config: configuration namespace passed to the simulator
+        :param seed: seed (int or SeedSequence) of the episodes, config.seed if None
         """
-        self.oran = ORAN()
+        self.config = config
+        self.seed_sequence = get_seed_sequence(getattr(config, 'seed', None) if seed is None else seed)
+
+        # Scenario trace recorded or replayed by every episode, attached from the first reset so that the simulator
+        # built here does not start an episode of the trace
+        self.trace = open_trace(config)
+        self.oran = ORAN(config, seed=self.seed_sequence.spawn(1)[0])
         self.current_time = 0
         self.simulation_time = 10  # 10 sec
 
         self.done = False
+        self.profiler = get_profiler()
+
+        # Two state buffers used in turn, a returned state stays valid while the agent records its transition
+        self.states = np.zeros((2, 1, self.oran.state_space), dtype=STATE_DTYPE)
+        self.states_idx = 0
+
+    def get_state(self):
+        """
+        :return: (state_space,) view of the state written to the buffer not holding the previous state
+        """
+        self.states_idx ^= 1
+
+        return self.oran.get_states(self.states[self.states_idx])[0]
 
     def step(self, action):
+        """
+        :return: next state, reward, done flag and info dict, with the durations (sec) of the simulator phases in
+        info['timings'] when profiling is on
+        """
+        if self.profiler.enabled:
+            self.profiler.clear(SIM_PHASES)
 
         self.oran.update_system(self.current_time, action)
 
-        next_state = self.oran.get_state_oran()
+        next_state = self.get_state()
 
         reward = self.oran.get_sum_reward()
 
@@ -38,15 +68,152 @@ class ORANSimEnv:
             self.done = True
 
         self.current_time += TIME_STEP
+        info = dict(timings=self.profiler.get(SIM_PHASES)) if self.profiler.enabled else {}
 
-        return next_state, reward, self.done
+        return next_state, reward, self.done, info
 
     def reset(self):
-        self.oran = ORAN()
+        # Every episode is a new scenario with its own seed
+        self.oran = ORAN(self.config, seed=self.seed_sequence.spawn(1)[0], trace=self.trace)
         self.current_time = 0
         self.done = False
 
-        return self.oran.get_state_oran()
+        return self.get_state()
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+
+    def snapshot(self, out=None):
+        """
+        :param out: blob of a previous snapshot to overwrite, a new one if None
+        :return: uint8 blob of the episode time, done flag, number of episode seeds spawned, position in the scenario
+        trace (-1 and 0 without trace) and simulator state
+        """
+        trace_episode, trace_step = self.trace.get_position() if self.trace is not None else (-1, 0)
+        header = np.array([self.current_time, self.done, self.seed_sequence.n_children_spawned, trace_episode,
+                           trace_step], dtype=np.float64)
+
+        if out is None:
+            return np.concatenate([header.view(np.uint8), self.oran.snapshot()])
+        out[:header.nbytes] = header.view(np.uint8)
+        self.oran.snapshot(out[header.nbytes:])
+
+        return out
+
+    def restore(self, blob):
+        """
+        Return to the state of a snapshot of an environment with the same configuration, the scenario trace returns
+        to the step of the snapshot
+        """
+        header = blob[:5 * 8].view(np.float64)
+        self.current_time = header[0]
+        self.done = bool(header[1])
+        self.seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy,
+                                                    spawn_key=self.seed_sequence.spawn_key,
+                                                    pool_size=self.seed_sequence.pool_size,
+                                                    n_children_spawned=int(header[2]))
+        if self.trace is not None:
+            self.trace.seek(int(header[3]), int(header[4]))
+        self.oran.restore(blob[5 * 8:])
+
+
+class VectorORANEnv:
+    """
+    Vectorized environment stepping num_envs independent ORAN scenarios held in batched arrays.
+    Finished sub-environments are reset automatically, their final states are kept in final_states. Scenario traces
+    are not supported, they only start episodes on resets of all environments.
+    """
+
+    def __init__(self, num_envs, config=None, seed=None):
+        """
+        Initialize the batched ORAN environments.
+        :param num_envs: Number of sub-environments.
+        :param config: configuration namespace passed to the simulator
+        :param seed: scenario seed (int or SeedSequence), config.seed if None
+        """
+        self.num_envs = num_envs
+        if getattr(config, 'trace_record', None) or getattr(config, 'trace_replay', None):
+            raise ValueError("Scenario traces need full resets, use ORANSimEnv or ParallelORANEnv")
+        self.oran = ORAN(config, num_envs=num_envs, seed=getattr(config, 'seed', None) if seed is None else seed)
+        self.current_time = np.zeros(num_envs)
+        self.simulation_time = 10  # 10 sec
+
+        self.done = np.zeros(num_envs, dtype=bool)
+        self.profiler = get_profiler()
+
+        # Two state buffers used in turn, and the final states of the last step
+        self.states = np.zeros((2, num_envs, self.oran.state_space), dtype=STATE_DTYPE)
+        self.states_idx = 0
+        self.final_states = np.zeros((num_envs, self.oran.state_space), dtype=STATE_DTYPE)
+
+    def get_states(self):
+        """
+        :return: (num_envs, state_space) states written to the buffer not holding the previous states
+        """
+        self.states_idx ^= 1
+
+        return self.oran.get_states(self.states[self.states_idx])
+
+    def step(self, action):
+        """
+        :param action: (num_envs, num_gnbs) boolean gNB activation masks
+        :return: (num_envs, state_space) states, (num_envs,) rewards, (num_envs,) done flags and info dict, with the
+        durations (sec) of the simulator phases of the batched step in info['timings'] when profiling is on
+        """
+        if self.profiler.enabled:
+            self.profiler.clear(SIM_PHASES)
+
+        self.oran.update_system(self.current_time, action)
+
+        next_state = self.get_states()
+
+        reward = self.oran.get_rewards()
+
+        self.done = reward >= REWARD_THRESHOLD
+
+        self.current_time += TIME_STEP
+
+        # Auto-reset finished sub-environments, their next state is the initial state of the new episode
+        np.copyto(self.final_states, next_state)
+        env_idx = np.flatnonzero(self.done)
+        if len(env_idx):
+            self.oran.reset_envs(env_idx)
+            self.current_time[env_idx] = 0
+            next_state[env_idx] = self.oran.get_states()[env_idx]
+        info = dict(timings=self.profiler.get(SIM_PHASES)) if self.profiler.enabled else {}
+
+        return next_state, reward, self.done, info
+
+    def reset(self):
+        self.oran.reset_envs(np.arange(self.num_envs))
+        self.current_time[:] = 0
+        self.done[:] = False
+
+        return self.get_states()
+
+    def snapshot(self, out=None):
+        """
+        :param out: blob of a previous snapshot to overwrite, a new one if None
+        :return: uint8 blob of the times, done flags and simulator state of the sub-environments
+        """
+        header = np.concatenate([self.current_time, self.done]).astype(np.float64)
+
+        if out is None:
+            return np.concatenate([header.view(np.uint8), self.oran.snapshot()])
+        out[:header.nbytes] = header.view(np.uint8)
+        self.oran.snapshot(out[header.nbytes:])
+
+        return out
+
+    def restore(self, blob):
+        """
+        Return to the state of a snapshot of an environment with the same configuration
+        """
+        header = blob[:2 * self.num_envs * 8].view(np.float64)
+        self.current_time[:] = header[:self.num_envs]
+        self.done[:] = header[self.num_envs:] > 0
+        self.oran.restore(blob[2 * self.num_envs * 8:])
 
 
 class ORANTestbedEnv:
@@ -106,7 +273,7 @@ class ORANTestbedEnv:
         if reward >= REWARD_THRESHOLD:
             self.done = True
 
-        return next_state, reward, self.done
+        return next_state, reward, self.done, {}
 
     def reset(self):
 
@@ -123,11 +290,24 @@ class UnifiedEnv:
         self.config = config
 
         if self.env_type == 'sim':
-            self.env = ORANSimEnv()
+            self.env = ORANSimEnv(config)
+        elif self.env_type == 'vec':
+            self.env = VectorORANEnv(num_envs=config.num_envs if hasattr(config, 'num_envs') else 8, config=config)
+        elif self.env_type == 'pool':
+            from parallel_env import ParallelORANEnv
+            self.env = ParallelORANEnv(num_workers=config.num_envs if hasattr(config, 'num_envs') else 8,
+                                       seed=config.seed if hasattr(config, 'seed') else None, config=config)
         elif self.env_type == 'testbed':
             self.env = ORANTestbedEnv()
         else:
-            raise ValueError("Invalid environment type. Choose 'sim' or 'testbed'.")
+            raise ValueError("Invalid environment type. Choose 'sim', 'vec', 'pool' or 'testbed'.")
+
+        self.num_envs = self.env.num_envs if hasattr(self.env, 'num_envs') else 1
+
+    @property
+    def final_states(self):
+        """Final states of the last step, differ from the returned states for auto-reset sub-environments"""
+        return self.env.final_states if hasattr(self.env, 'final_states') else None
 
     def step(self, action):
 
@@ -135,4 +315,8 @@ class UnifiedEnv:
 
     def reset(self):
 
-        return self.env.reset()
\ No newline at end of file
+        return self.env.reset()
+
+    def close(self):
+        if hasattr(self.env, 'close'):
+            self.env.close()
\ No newline at end of file
@@ -0,0 +1,119 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+# One record of the handover event log
+HANDOVER_EVENT_DTYPE = np.dtype([
+    ('time', np.float32),       # Simulation time of the handover (sec)
+    ('env', np.int32),          # Environment index
+    ('ue', np.int32),           # UE index
+    ('source', np.int16),       # Source gNB index
+    ('target', np.int16),       # Target gNB index
+    ('margin', np.float32),     # RSRP margin of the target over the serving gNB, after hysteresis (dB)
+])
+
+
+# -- Functions
+
+class HandoverManager:
+    """
+    Handover subsystem working on the per-step RSRP matrix of the channel engine.
+    A UE eligible for handover triggers when the RSRP of the best available neighbour exceeds the one of its serving
+    gNB by the hysteresis. The trigger must hold towards the same target for the time-to-trigger, which shrinks
+    linearly with the margin (dynamic TTT).
+    TTT counters and targets are (num_envs, num_ues) arrays, executed handovers are appended to a compact event log.
+    """
+    def __init__(self, num_envs, num_ues, hysteresis=HO_HYSTERESIS, ttt=HO_TTT, ttt_margin=HO_TTT_MARGIN,
+                 log_capacity=HO_LOG_CAPACITY):
+        """
+        :param hysteresis: RSRP offset the target must exceed the serving gNB by (dB)
+        :param ttt: time-to-trigger at zero margin (sec)
+        :param ttt_margin: margin above which the handover is immediate (dB)
+        :param log_capacity: number of events kept in the ring buffer log
+        """
+        self.num_envs = num_envs
+        self.num_ues = num_ues
+        self.hysteresis = hysteresis
+        self.ttt = ttt
+        self.ttt_margin = ttt_margin
+
+        # Time the trigger condition has held and the target it held for
+        self.ttt_counter = np.zeros((num_envs, num_ues))
+        self.ttt_target = np.full((num_envs, num_ues), -1, dtype=np.int64)
+
+        # Ring buffer of handover events
+        self.events = np.zeros(log_capacity, dtype=HANDOVER_EVENT_DTYPE)
+        self.num_events = 0
+
+    def reset(self, env_idx):
+        self.ttt_counter[env_idx] = 0
+        self.ttt_target[env_idx] = -1
+
+    def update(self, rsrp, gnb_available, serving_gnb, eligible, dt):
+        """
+        Advance the TTT counters by one step and select the UEs to hand over
+        :param rsrp: (num_envs, num_ues, num_gnbs) RSRP of every gNB at every UE (dBm)
+        :param gnb_available: (num_envs, num_gnbs) gNBs that are handover candidates
+        :param serving_gnb: (num_envs, num_ues) index of the serving gNB
+        :param eligible: (num_envs, num_ues) UEs allowed to hand over
+        :param dt: time elapsed since the last update (sec)
+        :return: environment indices, UE indices, target gNBs and margins of the handovers to perform
+        """
+        # Best available neighbour of every UE
+        rsrp_neighbour = np.where(gnb_available[:, None, :], rsrp, -np.inf)
+        np.put_along_axis(rsrp_neighbour, serving_gnb[..., None], -np.inf, axis=2)
+        target = np.argmax(rsrp_neighbour, axis=2)
+        rsrp_target = np.take_along_axis(rsrp_neighbour, target[..., None], axis=2)[..., 0]
+
+        # Margin over the serving gNB, -inf without any candidate
+        rsrp_serving = np.take_along_axis(rsrp, serving_gnb[..., None], axis=2)[..., 0]
+        margin = rsrp_target - rsrp_serving - self.hysteresis
+        condition = eligible & (margin > 0)
+
+        # TTT counters keep running while the condition holds towards the same target
+        same_target = condition & (target == self.ttt_target)
+        self.ttt_counter[:] = np.where(same_target, self.ttt_counter + dt, np.where(condition, dt, 0))
+        self.ttt_target[:] = np.where(condition, target, -1)
+
+        # Dynamic TTT, shorter for larger margins
+        ttt_required = self.ttt * np.clip(1 - margin / self.ttt_margin, 0, 1)
+        trigger = condition & (self.ttt_counter >= ttt_required - 1e-9)
+
+        env_idx, ue_idx = np.nonzero(trigger)
+        self.ttt_counter[env_idx, ue_idx] = 0
+        self.ttt_target[env_idx, ue_idx] = -1
+
+        return env_idx, ue_idx, target[env_idx, ue_idx], margin[env_idx, ue_idx]
+
+    def log(self, current_time, env_idx, ue_idx, source_gnbs, target_gnbs, margins):
+        """
+        Append handover events to the ring buffer log
+        :param current_time: (num_envs,) time of each environment
+        """
+        num_new = len(ue_idx)
+        if num_new == 0:
+            return
+
+        capacity = len(self.events)
+        pos = (self.num_events + np.arange(num_new)) % capacity
+        self.events['time'][pos] = np.broadcast_to(current_time, (self.num_envs,))[env_idx]
+        self.events['env'][pos] = env_idx
+        self.events['ue'][pos] = ue_idx
+        self.events['source'][pos] = source_gnbs
+        self.events['target'][pos] = target_gnbs
+        self.events['margin'][pos] = margins
+        self.num_events += num_new
+
+    def get_events(self):
+        """
+        :return: logged handover events in chronological order (at most log_capacity of the latest)
+        """
+        capacity = len(self.events)
+        if self.num_events <= capacity:
+            return self.events[:self.num_events].copy()
+
+        return np.roll(self.events, -(self.num_events % capacity))
@@ -0,0 +1,189 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+
+# -- Functions
+
+def reflect(position, low, high):
+    """
+    Fold unbounded positions into [low, high] as if they bounced off the boundaries
+    :return: folded positions, and whether the motion is mirrored at each position (odd number of reflections)
+    """
+    width = high - low
+    unfolded = (position - low) % (2 * width)
+    mirrored = unfolded > width
+
+    return low + np.where(mirrored, 2 * width - unfolded, unfolded), mirrored
+
+
+def get_positions(x, y, speed, heading, dt):
+    """
+    Positions after every step of UEs moving at the given speeds and headings, one cumulative sum over the steps
+    :param x, y: (num_ues,) start positions
+    :param speed, heading: (num_steps, num_ues) speed and direction during every step
+    :return: (num_steps, num_ues) x and y at the end of every step
+    """
+    return (x + np.cumsum(speed * np.cos(heading) * dt, axis=0),
+            y + np.cumsum(speed * np.sin(heading) * dt, axis=0))
+
+
+def get_random_walk_tracks(x, y, speed, direction, num_steps, dt, rng, max_turn=0.1 * np.pi, **kwargs):
+    """
+    Random walk: constant speed, the direction turns by a uniform angle within [-max_turn, max_turn] after every step
+    :param x, y, speed, direction: (num_ues,) state at the start of the tracks
+    :param rng: np.random.Generator of the tracks
+    :return: (num_steps, num_ues) x, y, speed and direction at the end of every step
+    """
+    turns = rng.uniform(-max_turn, max_turn, size=(num_steps, len(x)))
+    direction = direction + np.cumsum(turns, axis=0)
+    speed = np.broadcast_to(speed, direction.shape)
+
+    # Every step moves along the direction before its turn
+    x, y = get_positions(x, y, speed, direction - turns, dt)
+
+    return x, y, speed, direction
+
+
+def get_random_waypoint_tracks(x, y, speed, direction, num_steps, dt, rng, extent=None, **kwargs):
+    """
+    Random waypoint: every UE heads at its speed to a uniform random waypoint of the area, then to the next one
+    :param extent: (x_min, y_min, x_max, y_max) area of the waypoints
+    :return: (num_steps, num_ues) x, y, speed and direction at the end of every step
+    """
+    num_ues = len(x)
+    x_min, y_min, x_max, y_max = extent
+    duration = num_steps * dt
+
+    # Draw legs until every UE has enough of them to cover the tracks
+    waypoint_x, waypoint_y, arrival_time = [x], [y], [np.zeros(num_ues)]
+    while arrival_time[-1].min() < duration:
+        waypoint_x.append(rng.uniform(x_min, x_max, size=num_ues))
+        waypoint_y.append(rng.uniform(y_min, y_max, size=num_ues))
+        length = np.hypot(waypoint_x[-1] - waypoint_x[-2], waypoint_y[-1] - waypoint_y[-2])
+        arrival_time.append(arrival_time[-1] + length / speed)
+    waypoint_x, waypoint_y, arrival_time = np.stack(waypoint_x), np.stack(waypoint_y), np.stack(arrival_time)
+    num_legs = len(arrival_time) - 1
+
+    # Leg of every UE at the end of every step, one search over the arrival times of all UEs shifted apart
+    time = np.arange(1, num_steps + 1)[:, None] * dt
+    shift = np.arange(num_ues) * (arrival_time.max() + duration)
+    leg = np.searchsorted((arrival_time + shift).T.ravel(), (time + shift).T.ravel(), side='right').reshape(num_ues, -1)
+    leg = np.minimum(leg.T - 1 - np.arange(num_ues) * (num_legs + 1), num_legs - 1)
+
+    ue_idx = np.arange(num_ues)
+    start_time, end_time = arrival_time[leg, ue_idx], arrival_time[leg + 1, ue_idx]
+    fraction = np.clip((time - start_time) / (end_time - start_time), 0, 1)
+    dx = waypoint_x[leg + 1, ue_idx] - waypoint_x[leg, ue_idx]
+    dy = waypoint_y[leg + 1, ue_idx] - waypoint_y[leg, ue_idx]
+
+    return (waypoint_x[leg, ue_idx] + fraction * dx, waypoint_y[leg, ue_idx] + fraction * dy,
+            np.broadcast_to(speed, leg.shape), np.arctan2(dy, dx))
+
+
+def get_gauss_markov_tracks(x, y, speed, direction, num_steps, dt, rng, memory=0.75, speed_std=0.5,
+                            direction_std=0.2 * np.pi, **kwargs):
+    """
+    Gauss-Markov: speed and direction are first-order autoregressive processes around the start speed and direction
+    of every UE, memory sets their correlation from one step to the next (0: memoryless, 1: straight line)
+    :return: (num_steps, num_ues) x, y, speed and direction at the end of every step
+    """
+    noise = rng.normal(0, 1, size=(num_steps, 2, len(x))) * np.sqrt(1 - memory ** 2)
+    mean_speed, mean_direction = speed, direction
+
+    speeds = np.empty((num_steps + 1, len(x)))
+    directions = np.empty((num_steps + 1, len(x)))
+    speeds[0], directions[0] = speed, direction
+    for step in range(num_steps):
+        speeds[step + 1] = memory * speeds[step] + (1 - memory) * mean_speed + speed_std * noise[step, 0]
+        directions[step + 1] = memory * directions[step] + (1 - memory) * mean_direction + \
+            direction_std * noise[step, 1]
+        np.maximum(speeds[step + 1], 0, out=speeds[step + 1])
+
+    # Every step moves with the speed and direction at its start
+    x, y = get_positions(x, y, speeds[:-1], directions[:-1], dt)
+
+    return x, y, speeds[1:], directions[1:]
+
+
+MOBILITY_MODELS = dict(random_walk=get_random_walk_tracks, random_waypoint=get_random_waypoint_tracks,
+                       gauss_markov=get_gauss_markov_tracks)
+
+
+class MobilityTracks:
+    """
+    Whole-episode UE tracks generated up front from the mobility stream of every environment, the step loop only
+    indexes into them. Episodes longer than the tracks continue with new tracks from the last state.
+    With reflection the tracks bounce off the boundary of the area, otherwise UEs can walk away from the gNBs.
+    """
+    def __init__(self, num_envs, num_ues, rngs, model='random_walk', num_steps=MOBILITY_NUM_STEPS, dt=TIME_STEP,
+                 extent=None, reflection=True):
+        """
+        :param rngs: list of np.random.Generator, one per environment
+        :param model: name of the mobility model in MOBILITY_MODELS
+        :param num_steps: number of steps of the tracks
+        :param dt: duration of a step (sec)
+        :param extent: (x_min, y_min, x_max, y_max) area of the UEs
+        :param reflection: reflect the tracks at the boundary of the area
+        """
+        self.num_envs = num_envs
+        self.num_ues = num_ues
+        self.rngs = rngs
+        self.get_tracks = MOBILITY_MODELS[model]
+        self.num_steps = num_steps
+        self.dt = dt
+        self.extent = extent
+        self.reflection = reflection
+
+        # (num_envs, num_steps, num_ues) state of the UEs at the end of every step
+        shape = (num_envs, num_steps, num_ues)
+        self.x = np.zeros(shape)
+        self.y = np.zeros(shape)
+        self.speed = np.zeros(shape)
+        self.direction = np.zeros(shape)
+
+        # Next step of the tracks of every environment
+        self.step = np.zeros(num_envs, dtype=np.int64)
+
+    def generate(self, env_idx, x, y, speed, direction):
+        """
+        Generate the tracks of the given environments
+        :param x, y, speed, direction: (num_envs, num_ues) UE state at the start of the tracks
+        """
+        for idx_env in env_idx:
+            tracks_x, tracks_y, tracks_speed, tracks_direction = self.get_tracks(
+                x[idx_env], y[idx_env], speed[idx_env], direction[idx_env], self.num_steps, self.dt,
+                self.rngs[idx_env], extent=self.extent)
+
+            # Mirrored motion flips the x or y component of the direction
+            if self.reflection:
+                x_min, y_min, x_max, y_max = self.extent
+                tracks_x, mirrored_x = reflect(tracks_x, x_min, x_max)
+                tracks_y, mirrored_y = reflect(tracks_y, y_min, y_max)
+                tracks_direction = np.where(mirrored_x, np.pi - tracks_direction, tracks_direction)
+                tracks_direction = np.where(mirrored_y, -tracks_direction, tracks_direction)
+
+            self.x[idx_env], self.y[idx_env] = tracks_x, tracks_y
+            self.speed[idx_env], self.direction[idx_env] = tracks_speed, tracks_direction
+
+        self.step[env_idx] = 0
+
+    def advance(self, x, y, speed, direction):
+        """
+        Move the UEs of every environment one step along their tracks
+        :param x, y, speed, direction: (num_envs, num_ues) UE arrays, updated in place
+        """
+        env_idx = np.flatnonzero(self.step == self.num_steps)
+        if len(env_idx):
+            self.generate(env_idx, x, y, speed, direction)
+
+        env_idx = np.arange(self.num_envs)
+        x[:] = self.x[env_idx, self.step]
+        y[:] = self.y[env_idx, self.step]
+        speed[:] = self.speed[env_idx, self.step]
+        direction[:] = self.direction[env_idx, self.step]
+        self.step += 1
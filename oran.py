@@ -1,239 +1,200 @@
 # -- Public Imports
-import random
+
 
 # -- Private Imports
 from utils import *
 from constants import *
+from channel import ChannelModel
+from shadowing import ShadowingMaps
+from topology import HexTopology, NeighbourIndex
+from telemetry import get_telemetry, TRACE, DEBUG
+from profiling import get_profiler
+from rng import RNGStreams, SUBSYSTEMS
+from traffic import TrafficEngine
+from mobility import MobilityTracks
+from scheduler import ProportionalScheduler
+from handover import HandoverManager
+from snapshot import StateLayout
 
 # -- Global Variables
 
+# UE attributes kept as (num_envs, num_ues) arrays on ORAN: (attribute, dtype, initial value)
+UE_FIELDS = (
+    ('x', np.float64, 0),
+    ('y', np.float64, 0),
+    ('speed', np.float64, 0),                # m/s
+    ('direction', np.float64, 0),            # rad
+    ('traffic_type', np.int8, 0),            # index into TRAFFIC_TYPES
+    ('data_rate', np.float64, 0),            # Demanding traffic (bps)
+    ('is_active', np.bool_, False),          # For bursty traffic: whether UE is in "on" phase
+    ('next_switch_time', np.float64, 0),     # Time of the next "on" or "off" switch
+    ('active_fraction', np.float64, 0),      # Fraction of the last step the UE was in "on" phase
+    ('buffer_size', np.float64, 0),
+    ('delay', np.float64, 0),
+    ('num_rbs_allocated', np.int64, 0),
+    ('service_rate', np.float64, 0),         # (bps) Current service rate depending on the num_rbs_allocated
+    ('serving_gnb', np.int64, 0),            # Index of the serving gNB
+    ('sinr', np.float64, -10),               # dB
+    ('in_rlf', np.bool_, False),             # Binary indicator whether the UE is in Radio Failure Link
+)
+
+# gNB attributes kept as (num_envs, num_gnbs) arrays on ORAN: (attribute, dtype, initial value)
+GNB_FIELDS = (
+    ('x', np.float64, 0),
+    ('y', np.float64, 0),
+    ('power_tx', np.float64, POWER_TX),
+    ('is_active', np.bool_, False),
+    ('active_time_interval', np.float64, 0),   # Total active_time_interval in sec
+    ('num_rbs_allocated', np.int64, 0),
+    ('throughput', np.float64, 0),
+    ('power_consumption', np.float64, 0),
+    ('num_ues', np.int64, 0),                  # Number of UEs served
+    ('num_ues_rlf', np.int64, 0),
+    ('buffer_size', np.float64, 0),            # Total buffer of the UEs served
+    ('mean_delay', np.float64, 0),             # Mean delay of the UEs served
+    ('activate_cost', np.float64, 0),
+)
+
+# Scheduling priority of each traffic type, indexed by traffic code
+PRIORITY_TRAFFIC_TYPE = np.array([dict(udp_bursty=2, tcp_bursty=1, tcp_full=1.5)[t] for t in TRAFFIC_TYPES])
+
+# Reward weights of throughput, power consumption, UEs in RLF and activation cost
+REWARD_WEIGHTS = (0.4, 0.4, 0.1, 0.1)
+
+# Number of KPMs in the state of each gNB
+NUM_STATE_GNB = 7
+
+# Number of global features at the end of the state
+NUM_STATE_GLOBAL = 1
+
+# Precision of the states handed to the agent
+STATE_DTYPE = np.float32
+
+# Phase of every ORAN method timed by the profiler, methods of the same phase add up
+PROFILE_PHASES = dict(
+    update_active_status='activation',
+    move_ues='mobility',
+    update_traffic='traffic',
+    update_sinr='sinr',
+    recycle_rbs='scheduling',
+    allocate_rbs='scheduling',
+    run_ttis='scheduling',
+    update_service_rate='service',
+    update_delay='service',
+    perform_handover='handover',
+    get_states='state',
+    get_rewards='reward',
+)
+SIM_PHASES = tuple(dict.fromkeys(PROFILE_PHASES.values()))
+
 
 # -- Functions
 
-# Define Resource Block class
-class RB:
+def _field_property(prefix, name):
     """
-    Resource Block contains info
+    Property exposing element [self.env, self.idx] of the array ORAN.<prefix>_<name>
     """
-    def __init__(self, rth):
-        self.rth = rth   # the idx of the RB
-        self.allocate_to = None      # UE to which the RB is allocated to
+    array_name = f"{prefix}_{name}"
 
-    def __str__(self):
-        """
-        Returns a string representation of the RB object.
-        """
-        return (
-            f"RB(rth={self.rth}, allocate_to={self.allocate_to})"
-        )
+    def fget(self):
+        return getattr(self.oran, array_name)[self.env, self.idx]
 
-    def reset(self):
-        self.allocate_to = None
+    def fset(self, value):
+        getattr(self.oran, array_name)[self.env, self.idx] = value
+        self.oran.kpms_dirty = True
+
+    return property(fget, fset)
 
 
 class UE:
     """
-    User Equipment (UE) class.
+    User Equipment (UE) view.
+    The UE state lives in the ORAN arrays, this object only reads and writes its own entries.
     """
 
-    def __init__(self, x, y, speed, traffic_type, serving_gnb):
-        """
-        Initialize a UE object.
-        :param x: Initial x-coordinate of the UE.
-        :param y: Initial y-coordinate of the UE.
-        :param speed: Speed of the UE in meters per second.
-        :param traffic_type: Type of traffic ('tcp_full', 'udp_bursty', or 'tcp_bursty').
-        :param serving_gnb: The gNB serving this UE.
-        """
-        assert traffic_type in ('tcp_full', 'udp_bursty', 'tcp_bursty')
-
-        # Position info
-        self.x = x
-        self.y = y
-        self.speed = speed          # m/s
-        self.direction = np.random.uniform(0, 2*np.pi)
-
-        # Traffic info
-        self.traffic_type = traffic_type
-        self.data_rate = self.set_data_rate()   # Demanding traffic
-        self.is_active = False      # For bursty traffic: whether UE is in "on" phase
-        self.next_switch_time = 0   # Time until the next "on" or "off" time
-
-        # Delay info
-        self.buffer_size = 0
-        self.delay = 0
-        self.delay_max = 10   # sec
-
-        # PRB allocation
-        self.num_rbs_allocated = 0
-        self.service_rate = 0  # (bps) Current service rate depending on the num_rbs_allocated
-        self.serving_gnb = serving_gnb
-
-        # RLF
-        self.sinr = -10             # dB
-        self.rlf_threshold = -5     # dB
-        self.in_rlf = False         # Binary indicator whether the current UE is in Radio Failure Link
-
-    def set_data_rate(self):
-        if self.traffic_type in ('tcp_full', 'udp_bursty'):
-            return 20e6
-        else:   # tcp_bursty
-            return random.choice([750e3, 150e3])
-
-    def move(self, dt):
-        dx = self.speed * np.cos(self.direction) * dt
-        dy = self.speed * np.sin(self.direction) * dt
-        self.x += dx
-        self.y += dy
-
-        self.direction += np.random.uniform(-0.1*np.pi, 0.1*np.pi)
-
-    def update_traffic(self, current_time):
-        if self.traffic_type in ("udp_bursty", "tcp_bursty"):
-            if current_time >= self.next_switch_time:
-                self.is_active = not self.is_active  # Switch between on and off
-                self.next_switch_time = current_time + np.random.exponential(5)
-        else:
-            # TCP full-buffer traffic is always active
-            self.is_active = True
-
-    def update_service_rate(self):
-        self.service_rate = self.num_rbs_allocated * RB_EFFICIENCY
+    delay_max = DELAY_MAX           # sec
+    rlf_threshold = RLF_THRESHOLD   # dB
 
-    def update_delay(self):
+    def __init__(self, oran, idx, env=0):
         """
-        Update the delay based on the buffer size and service rate.
-        :param time_interval: Time interval in seconds.
+        :param oran: ORAN instance holding the UE arrays.
+        :param idx: Index of the UE in the ORAN arrays.
+        :param env: Index of the environment in the ORAN arrays.
         """
+        self.oran = oran
+        self.idx = idx
+        self.env = env
 
-        # Update buffer size based on data rate
-        if self.is_active:
-            self.buffer_size += self.data_rate * TIME_STEP
-
-        # Process buffer based on service rate
-        if self.service_rate > 0:
-            self.buffer_size = max(self.buffer_size - self.service_rate * TIME_STEP, 0)
-
-        # Calculate delay
-        if self.service_rate > 0:
-            self.delay = self.buffer_size / self.service_rate
-        else:
-            self.delay = self.delay_max
-
-    def get_sinr(self, gNBs):
-        # Constants
-        power_noise = BANDWIDTH_PER_RB * NOISE_POWER_DENSITY   # Noise power in watts
-
-        # Calculate received power from the serving gNB
-        serving_gNB = self.serving_gnb
-        distance = np.sqrt((self.x - serving_gNB.x)**2 + (self.y - serving_gNB.y)**2)
-        path_loss = self.get_path_loss(distance)
-        power_rx_dbm = serving_gNB.power_tx - path_loss
-
-        # Convert received power to linear scale watts
-        power_rx = 10 ** ((power_rx_dbm - 30) / 10)
-
-        # Calculate interference from neighbouring gNBs
-        power_interference = 0
-        for gNB in gNBs:
-            if gNB != serving_gNB:
-                distance = np.sqrt((self.x - gNB.x)**2 + (self.y - gNB.y)**2)
-                path_loss = self.get_path_loss(distance)
-                power_interference_dbm = gNB.power_tx - path_loss
-                power_interference += 10 ** ((power_interference_dbm - 30) / 10)
-
-        # Calculate SINR
-        sinr_linear = power_rx / (power_interference + power_noise)
-
-        sinr = 10 * np.log10(sinr_linear)
-
-        # Update RLF info
-        self.in_rlf = True if sinr < self.rlf_threshold else False
-        self.sinr = sinr
-
-        return sinr
+    @property
+    def traffic_type(self):
+        return TRAFFIC_TYPES[self.oran.ue_traffic_type[self.env, self.idx]]
 
-    def get_path_loss(self, distance):
+    @traffic_type.setter
+    def traffic_type(self, traffic_type):
+        assert traffic_type in TRAFFIC_TYPES
+        self.oran.ue_traffic_type[self.env, self.idx] = TRAFFIC_TYPES.index(traffic_type)
+        self.oran.kpms_dirty = True
 
-        # path_loss = 28.0 + 40.0 * np.log10(distance) + 20 * np.log10(CENTER_FREQ / 1e9)
-        path_loss = 20 * np.log10(distance) + 20 * np.log10(CENTER_FREQ / 1e9) + 20 * np.log10((4 * np.pi) / (3e8))
+    @property
+    def serving_gnb(self):
+        return gNB(self.oran, self.oran.ue_serving_gnb[self.env, self.idx], self.env)
 
-        # Add log-normal shadowing
-        shadowing = np.random.normal(0, SHADOWING_STD)
-
-        path_loss += shadowing
-
-        return path_loss
+    @serving_gnb.setter
+    def serving_gnb(self, gnb):
+        self.oran.ue_serving_gnb[self.env, self.idx] = gnb.idx
+        self.oran.kpms_dirty = True
 
     def reset(self):
         """Reset the UE state"""
         self.buffer_size = 0
         self.delay = 0
         self.num_rbs_allocated = 0
-        self.serving_gnb = None
         self.in_rlf = False
 
 
+for _name, _, _ in UE_FIELDS:
+    if _name not in ('traffic_type', 'serving_gnb'):
+        setattr(UE, _name, _field_property('ue', _name))
+
+
 # Define gNB class
 class gNB:
     """
-    gNB contains 9 UEs
+    gNB view.
+    The gNB state lives in the ORAN arrays, its UEs are the ones whose serving index points to it.
     """
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.UEs = []
-
-        # Power consumption model
-        self.P0 = 50  # Baseline power consumption (W)
-        self.PRF = 20  # RF power consumption (W)
-        self.PBB = 30  # Baseband power consumption (W)
-        self.PPAM_0 = 10  # Base power consumption of PAM (W)
-        self.eta_PAM = 0.8  # Efficiency of the power amplifier
-        self.n_ant = 32  # Number of antenna chains
-
-        # Default transmission power (W)
-        self.power_tx = POWER_TX
-
-        # Activation info
-        self.is_active = False
-        self.active_time_interval = 0   # Total active_time_interval in sec
-
-        # KPMs
-        self.throughput = 0
-        self.power_consumption = 0
-        self.num_ues_rlf = 0
-        self.activate_cost = 0
-        self.num_rbs_allocated = 0
 
-    def add_ue(self, ue):
-        self.UEs.append(ue)
+    # Power consumption model
+    P0 = 50  # Baseline power consumption (W)
+    PRF = 20  # RF power consumption (W)
+    PBB = 30  # Baseband power consumption (W)
+    PPAM_0 = 10  # Base power consumption of PAM (W)
+    eta_PAM = 0.8  # Efficiency of the power amplifier
+    n_ant = 32  # Number of antenna chains
 
-    def update_active_status(self, flag_active):
+    def __init__(self, oran, idx, env=0):
         """
-        Update the gNB's activation status and active time interval.
-        :param flag_active: Boolean indicating whether the gNB is active.
+        :param oran: ORAN instance holding the gNB arrays.
+        :param idx: Index of the gNB in the ORAN arrays.
+        :param env: Index of the environment in the ORAN arrays.
         """
-        if self.is_active != flag_active:
-            self.active_time_interval = 0
-        else:
-            if self.is_active:
-                self.active_time_interval += TIME_STEP
+        self.oran = oran
+        self.idx = idx
+        self.env = env
 
-        self.is_active = True if flag_active else False
+    def __str__(self):
+        return f"gNB(idx={self.idx}, x={self.x:.1f}, y={self.y:.1f})"
 
-        # if the gNB is inactive, reset relevant metrics
-        if not self.is_active:
-            self.num_rbs_allocated = 0
-            for ue in self.UEs:
-                ue.num_rbs_allocated = 0
-                ue.service_rate = 0
-                ue.buffer_size = 0
-                ue.delay = 0
-                ue.in_rlf = True   # Mark UE as in RLF due to gNB inactivity
+    @property
+    def ue_mask(self):
+        return self.oran.ue_serving_gnb[self.env] == self.idx
 
-    def update_num_rbs_allocated(self):
-        self.num_rbs_allocated = sum(ue.num_rbs_allocated for ue in self.UEs)
+    @property
+    def UEs(self):
+        return [UE(self.oran, idx_ue, self.env) for idx_ue in np.flatnonzero(self.ue_mask)]
+
+    def add_ue(self, ue):
+        ue.serving_gnb = self
 
     def set_power_tx(self):
 
@@ -241,31 +202,21 @@ class gNB:
 
     def get_throughput(self):
         """
-        Calculate the total throughput of the cell (sum of service rates of all UEs)
+        Total throughput of the cell (sum of service rates of all UEs), read from the KPM cache
         :return:
         """
-        throughput = sum(ue.service_rate for ue in self.UEs)
-        self.throughput = throughput
+        self.oran.update_kpms()
 
-        return throughput
+        return self.throughput
 
     def get_power_consumption(self):
         """
-        Calculate the total power consumption of RU (watts)
+        Total power consumption of RU (watts), read from the KPM cache
         :return:
         """
-        # Calculate PPAM_c(r) based on the number of RBs
-        PPAM_c = self.get_PPAM_c()
-
-        # Calculate PPAM
-        PPAM = self.PPAM_0 * PPAM_c * self.eta_PAM * self.n_ant
-
-        # Calculate total power consumption
-        P_total = self.P0 + self.PRF + self.PBB + PPAM
+        self.oran.update_kpms()
 
-        self.power_consumption = P_total
-
-        return P_total
+        return self.power_consumption
 
     def get_PPAM_c(self):
         PPAM_c = self.num_rbs_allocated / NUM_RBS
@@ -281,16 +232,13 @@ class gNB:
         return ratio
 
     def get_num_ues_rlf(self):
-        num_ues_rlf = 0
-        for ue in self.UEs:
-            num_ues_rlf += int(ue.in_rlf)
-
-        self.num_ues_rlf = num_ues_rlf
+        self.oran.update_kpms()
 
-        return num_ues_rlf
+        return int(self.num_ues_rlf)
 
     def get_percentage_rlf(self, num_ues_rlf=None):
-        num_ues_total = len(self.UEs)
+        self.oran.update_kpms()
+        num_ues_total = int(self.num_ues)
         num_ues_rlf = self.get_num_ues_rlf() if num_ues_rlf==None else num_ues_rlf
 
         percentage_rlf = num_ues_rlf / num_ues_total
@@ -305,19 +253,16 @@ class gNB:
         return percentage_scheduled_rbs
 
     def get_activate_cost(self):
-        active_time_interval_ms = self.active_time_interval * 1e3
-        activate_cost = 0.9 ** (0.01 * active_time_interval_ms)
+        self.oran.update_kpms()
 
-        self.activate_cost = activate_cost
-
-        return activate_cost
+        return self.activate_cost
 
     def get_reward(self):
         """
         Calculate the reward value given the weight distributions
         :return:
         """
-        w1, w2, w3, w4 = 0.4, 0.4, 0.1, 0.1
+        w1, w2, w3, w4 = REWARD_WEIGHTS
 
         if self.is_active == True:
 
@@ -326,11 +271,6 @@ class gNB:
             num_ues_rlf = self.get_num_ues_rlf()
             activate_cost = self.get_activate_cost()
 
-            # throughput = self.throughput
-            # power_consumption = self.power_consumption
-            # num_ues_rlf = self.num_ues_rlf
-            # activate_cost = self.activate_cost
-
             reward = w1 * throughput - w2 * power_consumption - w3 * num_ues_rlf - w4 * activate_cost
             return reward, [throughput, power_consumption, num_ues_rlf, activate_cost]
 
@@ -366,69 +306,243 @@ class gNB:
         return state_gnb
 
 
+for _name, _, _ in GNB_FIELDS:
+    setattr(gNB, _name, _field_property('gnb', _name))
+
+
 # Define O-RAN class
 class ORAN:
     """
-    ORAN contains 7 gnbs
+    ORAN contains a hexagonal multi-ring layout of gNBs (7 with one ring), simulated for num_envs independent
+    environments at once.
+    All UE and gNB state is stored as structure-of-arrays (ue_<attr> of shape (num_envs, num_ues),
+    gnb_<attr> of shape (num_envs, num_gnbs)), each phase of update_system is a vectorized operation over all
+    environments and UEs. UE and gNB objects of the first environment are kept as views for compatibility.
     """
-    def __init__(self):
-        self.num_gnbs = NUM_GNB
+    def __init__(self, config=None, num_envs=1, seed=None, trace=None):
+        """
+        :param config: configuration namespace, simulator options fall back to defaults when missing
+        :param num_envs: number of independent environments simulated together
+        :param seed: scenario seed (int or SeedSequence), every environment and subsystem draws from its own stream
+        :param trace: TraceRecorder recording the scenarios, or TraceReplay replaying them instead of sampling
+        """
+        self.num_envs = num_envs
+        self.trace = trace
+        self.rngs = RNGStreams(seed, num_envs)
         self.radius = INTER_DISTANCE_GNB
+        self.telemetry = get_telemetry()
+        self.topology = HexTopology(num_rings=getattr(config, 'num_rings', NUM_RINGS), inter_distance=self.radius,
+                                    wrap_around=getattr(config, 'wrap_around', False))
+        self.num_gnbs = self.topology.num_cells
+        self.num_ues_per_gnb = getattr(config, 'num_ues_per_gnb', NUM_UES_PER_GNB)
+        self.num_ues = self.num_gnbs * self.num_ues_per_gnb
+        self.state_space = self.num_gnbs * NUM_STATE_GNB + NUM_STATE_GLOBAL
+
+        # Allocate UE and gNB arrays
+        for name, dtype, value in UE_FIELDS:
+            setattr(self, f"ue_{name}", np.full((num_envs, self.num_ues), value, dtype=dtype))
+        for name, dtype, value in GNB_FIELDS:
+            setattr(self, f"gnb_{name}", np.full((num_envs, self.num_gnbs), value, dtype=dtype))
+
+        # Run the scheduler, buffers and delays every TTI within each step
+        self.tti_mode = getattr(config, 'tti_mode', False)
+
+        # Define PRBs: one RB ownership grid per environment, or per gNB with per-cell grids
+        per_cell_rbs = config.rb_grid == 'per_cell' if hasattr(config, 'rb_grid') else False
+        self.scheduler = ProportionalScheduler(num_envs, self.num_ues, self.num_gnbs, per_cell=per_cell_rbs)
 
         # Define cellular network
-        self.gNBs = self.get_init_gnbs()
-        self.set_init_ues_per_gnb()
-
-        # Define PRBs
-        self.RBs = [RB(rth=idx) for idx in range(NUM_RBS)]
-
-        # Active status for all gNBs
-        self.gnbs_active_status = []
-
-    def get_init_gnbs(self):
-        gNBs = [gNB(2000, 2000)]
-        for idx_gnb in range(self.num_gnbs-1):
-            angle = 2 * np.pi * idx_gnb / 6
-            x = 2000 + self.radius * np.cos(angle)
-            y = 2000 + self.radius * np.sin(angle)
-            gNBs.append(gNB(x, y))
-
-        return gNBs
-
-    def set_init_ues_per_gnb(self):
-        for gnb in self.gNBs:
-            for idx_ue in range(NUM_UES_PER_GNB):
-                # Random init position within 1700m radius of the central gNB
-                angle = np.random.uniform(0, 2 * np.pi)
-                radius = np.random.uniform(0, self.radius/2)
-                x = 2000 + radius * np.cos(angle)
-                y = 2000 + radius * np.sin(angle)
-
-                # Random speed
-                speed = np.random.uniform(2, 4)
-
-                # Assign traffic type based on distributions
-                if idx_ue < 2:   # 25%
-                    traffic_type = 'tcp_full'
-                elif idx_ue < 4: # 25%
-                    traffic_type = 'udp_bursty'
-                else:            # 50%
-                    traffic_type = 'tcp_bursty'
-
-                ue = UE(x, y, speed, traffic_type, gnb)
-                gnb.add_ue(ue)
+        self.set_init_gnbs()
+
+        # Interference radius, only gNBs within it are evaluated for a UE if set
+        interference_radius = getattr(config, 'interference_radius', None)
+        neighbours = NeighbourIndex(self.topology, interference_radius) if interference_radius else None
+
+        # Shadowing maps of the gNBs, each restricted to the area its UEs are evaluated in with an interference radius
+        self.shadowing = ShadowingMaps(num_envs, self.topology, self.rngs['shadowing'],
+                                       radius=neighbours.reach if neighbours is not None else None,
+                                       decorrelation_distance=getattr(config, 'shadowing_decorrelation',
+                                                                      SHADOWING_DECORRELATION),
+                                       cache_path=getattr(config, 'shadowing_cache', None))
+
+        # UE x gNB channel matrices of the current step, limited to the gNBs within the interference radius if set
+        self.channel = ChannelModel(num_envs, self.num_ues, self.num_gnbs, self.shadowing, topology=self.topology,
+                                    neighbours=neighbours)
+
+        # Whole-episode UE tracks, spanning an episode of max_step steps
+        self.mobility = MobilityTracks(num_envs, self.num_ues, self.rngs['mobility'],
+                                       model=getattr(config, 'mobility', 'random_walk'),
+                                       num_steps=getattr(config, 'max_step', MOBILITY_NUM_STEPS),
+                                       extent=self.topology.extent,
+                                       reflection=getattr(config, 'mobility_boundary', 'reflect') == 'reflect')
+
+        # On/off traffic processes
+        self.traffic = TrafficEngine(num_envs, self.num_ues, self.rngs['traffic'])
+
+        # Handover TTT state and event log
+        self.handover = HandoverManager(num_envs, self.num_ues,
+                                        hysteresis=getattr(config, 'ho_hysteresis', HO_HYSTERESIS),
+                                        ttt=getattr(config, 'ho_ttt', HO_TTT),
+                                        ttt_margin=getattr(config, 'ho_ttt_margin', HO_TTT_MARGIN))
+
+        self.reset_envs(np.arange(num_envs))
+
+        # Byte layout of the snapshots, built on the first snapshot or restore
+        self.state_layout = None
+
+        # The gNB KPMs are recomputed on the first read after a state change
+        self.kpms_dirty = True
+
+        # Time the phases of the step when profiling is on
+        self.profiler = get_profiler()
+        self.profiler.instrument(self, PROFILE_PHASES)
+
+        # Views of the first environment
+        self.gNBs = [gNB(self, idx_gnb) for idx_gnb in range(self.num_gnbs)]
+        self.UEs = [UE(self, idx_ue) for idx_ue in range(self.num_ues)]
+
+    @property
+    def rb_owner(self):
+        """(num_envs, num_pools, NUM_RBS) index of the UE each RB is allocated to, -1 if free"""
+        return self.scheduler.rb_owner
+
+    @property
+    def gnbs_active_status(self):
+        """Active status for all gNBs"""
+        return self.gnb_is_active
+
+    def set_init_gnbs(self):
+        self.gnb_x[:] = self.topology.gnb_x
+        self.gnb_y[:] = self.topology.gnb_y
+
+    def reset_envs(self, env_idx):
+        """
+        Reset the UEs, gNBs, RB grids and shadowing maps of the given environments to a new random initial state
+        :param env_idx: indices of the environments to reset
+        :return:
+        """
+        for name, _, value in UE_FIELDS:
+            getattr(self, f"ue_{name}")[env_idx] = value
+        for name, _, value in GNB_FIELDS:
+            if name not in ('x', 'y'):
+                getattr(self, f"gnb_{name}")[env_idx] = value
+        self.scheduler.reset(env_idx)
+        self.handover.reset(env_idx)
+        self.kpms_dirty = True
+
+        if self.trace is None:
+            self.init_scenario(env_idx)
+        else:
+            self.trace.init_scenario(self, env_idx)
+
+    def init_scenario(self, env_idx):
+        """
+        Draw the shadowing maps, UE placement and traffic of the given environments
+        """
+        self.shadowing.reset(env_idx)
+        self.set_init_ues_per_gnb(env_idx)
+
+    def set_init_ues_per_gnb(self, env_idx):
+        serving_gnb = np.arange(self.num_ues) // self.num_ues_per_gnb
+
+        # Assign traffic type based on distributions: 2x tcp_full, 2x udp_bursty, rest tcp_bursty per gNB
+        idx_ue = np.arange(self.num_ues) % self.num_ues_per_gnb
+        traffic_type = np.where(idx_ue < 2, 0, np.where(idx_ue < 4, 1, 2))
+        for idx_env in env_idx:
+            rng = self.rngs['placement'][idx_env]
+
+            # Random init position within radius/2 of the serving gNB
+            self.ue_x[idx_env], self.ue_y[idx_env] = self.topology.place_ues(serving_gnb, rng)
+
+            # Random speed and direction
+            self.ue_speed[idx_env] = rng.uniform(2, 4, size=self.num_ues)
+            self.ue_direction[idx_env] = rng.uniform(0, 2*np.pi, size=self.num_ues)
+
+        self.ue_traffic_type[env_idx] = traffic_type
+        self.ue_serving_gnb[env_idx] = serving_gnb
+
+        # Tracks of the episode
+        self.mobility.generate(env_idx, self.ue_x, self.ue_y, self.ue_speed, self.ue_direction)
+
+        # Demanding traffic and on/off processes
+        self.traffic.reset(env_idx, self.ue_traffic_type, self.ue_data_rate, self.ue_is_active,
+                           self.ue_next_switch_time)
+
+    def get_state_arrays(self):
+        """
+        Arrays holding the simulator state, in snapshot order. They are updated in place by the simulator.
+        Channel matrices are recomputed at every step and cached shadowing maps never change, neither is saved.
+        :return: dict of arrays
+        """
+        arrays = {f"ue_{name}": getattr(self, f"ue_{name}") for name, _, _ in UE_FIELDS}
+        arrays.update({f"gnb_{name}": getattr(self, f"gnb_{name}") for name, _, _ in GNB_FIELDS})
+        arrays.update(rb_owner=self.scheduler.rb_owner,
+                      ttt_counter=self.handover.ttt_counter,
+                      ttt_target=self.handover.ttt_target,
+                      handover_events=self.handover.events,
+                      last_switch_time=self.traffic.last_switch_time,
+                      traffic_draws=self.traffic.draws,
+                      num_traffic_draws_left=self.traffic.num_draws_left,
+                      mobility_x=self.mobility.x,
+                      mobility_y=self.mobility.y,
+                      mobility_speed=self.mobility.speed,
+                      mobility_direction=self.mobility.direction,
+                      mobility_step=self.mobility.step)
+        if not self.shadowing.cached:
+            arrays['shadowing_maps'] = self.shadowing.maps
+
+        return arrays
+
+    def snapshot(self, out=None):
+        """
+        Copy the full simulator state, random generator states included, into a flat uint8 blob
+        :param out: blob of a previous snapshot to overwrite, a new one if None
+        :return: uint8 blob
+        """
+        arrays = self.get_state_arrays()
+        arrays.update(num_handover_events=np.array([self.handover.num_events], dtype=np.int64),
+                      rng_state=self.rngs.get_state())
+        if self.state_layout is None:
+            self.state_layout = StateLayout(arrays)
+
+        return self.state_layout.pack(arrays, out)
+
+    def restore(self, blob):
+        """
+        Copy a snapshot back into the simulator arrays. No object is rebuilt, the UE and gNB views stay valid.
+        :param blob: uint8 blob returned by snapshot, of an ORAN with the same configuration
+        """
+        arrays = self.get_state_arrays()
+        arrays.update(num_handover_events=np.zeros(1, dtype=np.int64),
+                      rng_state=np.zeros((len(SUBSYSTEMS), self.num_envs, 6), dtype=np.uint64))
+        if self.state_layout is None:
+            self.state_layout = StateLayout(arrays)
+        self.state_layout.check(arrays)
+        self.state_layout.unpack(blob, arrays)
+
+        self.handover.num_events = int(arrays['num_handover_events'][0])
+        self.kpms_dirty = True
+        self.rngs.set_state(arrays['rng_state'])
+
+        # Traffic heaps hold the finite next switch times
+        for idx_env in range(self.num_envs):
+            self.traffic.rebuild(idx_env, self.ue_next_switch_time)
 
     def update_system(self, current_time, gnbs_active_status):
         """
         Update the entire ORAN system at each time step
-        :param current_time:
-        :param active_status:
+        :param current_time: scalar or (num_envs,) time of each environment
+        :param gnbs_active_status: (num_gnbs,) or (num_envs, num_gnbs) active flags
         :return:
         """
-        assert len(gnbs_active_status) == NUM_GNB
+        assert np.size(gnbs_active_status) == self.num_envs * self.num_gnbs
+        self.kpms_dirty = True
+        flag_active = np.asarray(gnbs_active_status, dtype=bool).reshape(self.num_envs, self.num_gnbs)
+        current_time = np.reshape(current_time, (-1, 1))
 
-        # Update active status for all gNBs
-        self.gnbs_active_status = gnbs_active_status
+        if self.tti_mode:
+            self.update_system_tti(current_time, flag_active)
+            return
 
         # Recycle unused RBs
         self.recycle_rbs()
@@ -436,68 +550,240 @@ class ORAN:
         # Allocate RBs according to proportional policy
         self.allocate_rbs()
 
-        # Update the number of RBs allocated for each gNB
-        for gnb in self.gNBs:
-            gnb.update_num_rbs_allocated()
-            gnb.set_power_tx()
+        # Update the number of RBs allocated and Tx power for each gNB
+        self.update_num_rbs_allocated()
+        self.gnb_power_tx[:] = POWER_TX * (self.gnb_num_rbs_allocated / NUM_RBS)
 
-        ue_buffer_size = []
-        ue_sinr = []
+        # Update active status for all gNBs
+        self.update_active_status(flag_active)
 
-        # Update gNBs and their UEs
-        for idx_gnb, gnb in enumerate(self.gNBs):
-            # Update active status for each gNB
-            gnb.update_active_status(gnbs_active_status[idx_gnb])
+        # Update UEs position, traffic status, SINR, service rate and delay
+        self.step_scenario(current_time)
+        self.update_sinr()
+        self.update_service_rate()
+        self.update_delay()
 
-            for ue in gnb.UEs:
-                # Update UE position
-                ue.move(TIME_STEP)
+        if self.telemetry.enabled(TRACE):
+            self.telemetry.emit(TRACE, 'ue_info', current_time=current_time.ravel().copy(),
+                                buffer_size=self.ue_buffer_size.copy(), sinr=self.ue_sinr.copy())
 
-                # Update UE traffic status
-                ue.update_traffic(current_time)
+        # Perform handover after all gNBs and UEs are updated
+        self.perform_handover(current_time)
+
+    def update_system_tti(self, current_time, flag_active):
+        """
+        Update the ORAN system with TTI-level scheduling: the gNBs' active status, positions, traffic and SINR are
+        updated once per step, then the scheduler, buffers and delays advance TTI by TTI
+        """
+        self.update_active_status(flag_active)
+
+        self.step_scenario(current_time)
+        self.update_sinr()
+        self.run_ttis(int(round(TIME_STEP / TTI)))
+
+        self.update_num_rbs_allocated()
+        self.gnb_power_tx[:] = POWER_TX * (self.gnb_num_rbs_allocated / NUM_RBS)
+
+        if self.telemetry.enabled(TRACE):
+            self.telemetry.emit(TRACE, 'ue_info', current_time=current_time.ravel().copy(),
+                                buffer_size=self.ue_buffer_size.copy(), sinr=self.ue_sinr.copy())
+
+        self.perform_handover(current_time)
+
+    def run_ttis(self, num_ttis):
+        """
+        Run num_ttis TTIs of proportional allocation, buffer arrivals and drain.
+        Grants are capped at the RBs a UE needs to empty its buffer within the TTI, so a pool only changes its
+        allocation when a UE holds more RBs than it needs, or needs more while the pool has free RBs. Within a step
+        the SINR, traffic and serving gNBs are fixed, between such events buffers evolve linearly and the per-TTI sums
+        of RBs and delays are accumulated in bulk, the allocation only runs for the pools of the event. The service
+        rate and delay of the UEs are set to their mean over the TTIs.
+        :param num_ttis: number of TTIs
+        """
+        ue_pool = self.scheduler.get_ue_pool(self.ue_serving_gnb).ravel()
+        num_pools = self.num_envs * self.scheduler.num_pools
+        rb_volume = RB_EFFICIENCY * TTI
+
+        # Only active UEs of active gNBs are scheduled
+        servable = (self.ue_is_active & np.take_along_axis(self.gnb_is_active, self.ue_serving_gnb, axis=1)).ravel()
+        pool_servable = np.bincount(ue_pool[servable], minlength=num_pools) > 0
+        weight = np.maximum((1 + self.ue_sinr) * PRIORITY_TRAFFIC_TYPE[self.ue_traffic_type], 0).ravel()
+        arrival = (self.ue_data_rate * TTI * self.ue_active_fraction).ravel()
+
+        # Views on the UE arrays, updated in place
+        buffer = self.ue_buffer_size.ravel()
+        num_rbs = self.ue_num_rbs_allocated.ravel()
+        num_rbs[~servable] = 0
+
+        buffer_sum = np.zeros_like(buffer)
+        num_rbs_sum = np.zeros(len(num_rbs), dtype=np.int64)
+        delay_sum = np.zeros_like(buffer)
+
+        # Segment state: inverse of the service rate, delay of the UEs without service, and the buffer sizes below
+        # which a UE holds more RBs than it needs and above which it needs more RBs from the free RBs of its pool
+        rate_inv = np.zeros_like(buffer)
+        delay_unserved = np.zeros_like(buffer)
+        buffer_low = np.zeros_like(buffer)
+        buffer_high = np.zeros_like(buffer)
+
+        changed_pool = pool_servable.copy()
+        start = 0
+        for tti in range(num_ttis):
+            if tti > start:
+                changed = (buffer <= buffer_low) | (buffer > buffer_high)
+                changed_pool = np.bincount(ue_pool[changed], minlength=num_pools) > 0 if changed.any() else None
+
+            # Reallocate the RBs of the changed pools according to proportional policy
+            if changed_pool is not None:
+                # Per-TTI sums over the segment with constant RB counts
+                if tti > start:
+                    num_rbs_sum += num_rbs * (tti - start)
+                    delay_sum += buffer_sum * rate_inv + delay_unserved * (tti - start)
+                    buffer_sum.fill(0)
+
+                realloc = changed_pool[ue_pool]
+                num_rbs[realloc] = 0
+                idx_realloc = np.flatnonzero(realloc & servable)
+                num_rbs_available = NUM_RBS - np.bincount(ue_pool, weights=num_rbs,
+                                                          minlength=num_pools).astype(np.int64)
+                num_rbs_available[~(changed_pool & pool_servable)] = 0
+                if len(idx_realloc):
+                    need = np.ceil((buffer[idx_realloc] + arrival[idx_realloc]) / rb_volume).astype(np.int64)
+                    num_rbs[idx_realloc] = self.scheduler.get_num_rbs(
+                        buffer[idx_realloc] * weight[idx_realloc], ue_pool[idx_realloc], num_rbs_available, need)
+
+                held = num_rbs > 0
+                service = num_rbs * RB_EFFICIENCY
+                np.divide(1, service, out=rate_inv, where=held)
+                rate_inv[~held] = 0
+                np.multiply(~held, DELAY_MAX, out=delay_unserved)
+                net_arrival = arrival - service * TTI
+
+                pool_free = NUM_RBS - np.bincount(ue_pool, weights=num_rbs, minlength=num_pools) > 0
+                np.subtract((num_rbs - 1) * rb_volume, arrival, out=buffer_low)
+                buffer_low[~held] = -np.inf
+                np.subtract(num_rbs * rb_volume, arrival, out=buffer_high)
+                buffer_high[~(servable & pool_free[ue_pool])] = np.inf
+                start = tti
+
+            # Buffer arrivals and drain
+            buffer += net_arrival
+            np.maximum(buffer, 0, out=buffer)
+            buffer_sum += buffer
+
+        num_rbs_sum += num_rbs * (num_ttis - start)
+        delay_sum += buffer_sum * rate_inv + delay_unserved * (num_ttis - start)
+
+        self.scheduler.assign(self.ue_serving_gnb, self.ue_num_rbs_allocated)
+        self.ue_service_rate[:] = num_rbs_sum.reshape(self.num_envs, self.num_ues) * (RB_EFFICIENCY / num_ttis)
+        self.ue_delay[:] = delay_sum.reshape(self.num_envs, self.num_ues) / num_ttis
+
+    def get_flat_gnb_idx(self):
+        """
+        :return: (num_envs, num_ues) index of the serving gNB in the flattened (num_envs * num_gnbs) gNB arrays
+        """
+        return self.ue_serving_gnb + np.arange(self.num_envs)[:, None] * self.num_gnbs
+
+    def get_cell_sums(self, values=None, flat_gnb_idx=None):
+        """
+        Segment sum of per-UE values over the serving cells, one bincount over all environments
+        :param values: (num_envs, num_ues) values, None to count the UEs
+        :param flat_gnb_idx: output of get_flat_gnb_idx, computed if None
+        :return: (num_envs, num_gnbs) sums
+        """
+        flat_gnb_idx = self.get_flat_gnb_idx() if flat_gnb_idx is None else flat_gnb_idx
+        sums = np.bincount(flat_gnb_idx.ravel(), weights=None if values is None else values.ravel(),
+                           minlength=self.num_envs * self.num_gnbs)
+
+        return sums.reshape(self.num_envs, self.num_gnbs)
 
-                # Update UE's SINR
-                ue.get_sinr(self.gNBs)
+    def update_num_rbs_allocated(self):
+        self.gnb_num_rbs_allocated[:] = self.get_cell_sums(self.ue_num_rbs_allocated)
 
-                # Update service rate based on allocated RBs
-                ue.update_service_rate()
+    def update_active_status(self, flag_active):
+        """
+        Update the gNBs' activation status and active time interval.
+        :param flag_active: (num_envs, num_gnbs) boolean array indicating whether each gNB is active.
+        """
+        changed = self.gnb_is_active != flag_active
+        self.gnb_active_time_interval[changed] = 0
+        self.gnb_active_time_interval[~changed & self.gnb_is_active] += TIME_STEP
 
-                # Update delay based on buffer_size and service_rate
-                ue.update_delay()
+        self.gnb_is_active[:] = flag_active
 
-                ue_buffer_size.append(ue.buffer_size)
-                ue_sinr.append(ue.sinr)
+        # if the gNB is inactive, reset relevant metrics of its UEs
+        self.gnb_num_rbs_allocated[~flag_active] = 0
+        ue_inactive = ~np.take_along_axis(flag_active, self.ue_serving_gnb, axis=1)
+        self.ue_num_rbs_allocated[ue_inactive] = 0
+        self.ue_service_rate[ue_inactive] = 0
+        self.ue_buffer_size[ue_inactive] = 0
+        self.ue_delay[ue_inactive] = 0
+        self.ue_in_rlf[ue_inactive] = True   # Mark UE as in RLF due to gNB inactivity
 
-            print("UE info:\n")
-            print(f"Buffer size: {ue_buffer_size}")
-            print(f"SINR: {ue_sinr}")
+    def step_scenario(self, current_time):
+        """
+        Move the UEs and advance their traffic, sampled or taken from the scenario trace
+        """
+        if self.trace is None:
+            self.update_scenario(current_time)
+        else:
+            self.trace.update_scenario(self, current_time)
 
-        # Perform handover after all gNBs and UEs are updated
-        self.perform_handover()
+    def update_scenario(self, current_time):
+        self.move_ues()
+        self.update_traffic(current_time)
 
-    def get_proportional_weights(self):
+    def move_ues(self):
+        self.mobility.advance(self.ue_x, self.ue_y, self.ue_speed, self.ue_direction)
+
+    def update_traffic(self, current_time):
+        # TCP full-buffer traffic is always active, bursty traffic switches between on and off within the step
+        self.traffic.advance(np.ravel(current_time), TIME_STEP, self.ue_traffic_type, self.ue_is_active,
+                             self.ue_next_switch_time, self.ue_active_fraction)
+
+    def update_sinr(self):
+        # Update the UE x gNB channel matrices, only active gNBs with non-zero power interfere
+        transmitting = self.gnb_is_active & (self.gnb_power_tx > 0)
+        sinr = self.channel.update(self.ue_x, self.ue_y, self.gnb_x, self.gnb_y, self.gnb_power_tx, transmitting,
+                                   self.ue_serving_gnb)
+
+        # Update RLF info
+        self.ue_sinr[:] = sinr
+        self.ue_in_rlf[:] = sinr < RLF_THRESHOLD
+
+    def update_service_rate(self):
+        self.ue_service_rate[:] = self.ue_num_rbs_allocated * RB_EFFICIENCY
+
+    def update_delay(self):
         """
-        Calculate proportional weights for all UEs
-        :return:
+        Update the delay based on the buffer size and service rate.
         """
-        priority_traffic_type = dict(udp_bursty=2, tcp_bursty=1, tcp_full=1.5)
+        # Update buffer size based on data rate
+        self.ue_buffer_size += self.ue_data_rate * TIME_STEP * self.ue_active_fraction
 
-        proportional_weights = {}
-        total_weighted_buffer = 0
+        # Process buffer based on service rate
+        served = self.ue_service_rate > 0
+        self.ue_buffer_size[served] = np.maximum(
+            self.ue_buffer_size[served] - self.ue_service_rate[served] * TIME_STEP, 0)
 
-        for gnb in self.gNBs:
-            for ue in gnb.UEs:
-                weight = 1 + ue.sinr
-                priority = priority_traffic_type.get(ue.traffic_type)
+        # Calculate delay
+        self.ue_delay[:] = DELAY_MAX
+        self.ue_delay[served] = self.ue_buffer_size[served] / self.ue_service_rate[served]
 
-                weighted_buffer = ue.buffer_size * weight * priority
-                proportional_weights[ue] = weighted_buffer
-                total_weighted_buffer += weighted_buffer
+    def get_proportional_weights(self):
+        """
+        Calculate proportional weights for all UEs
+        :return: (num_envs, num_ues) array of weights
+        """
+        weight = 1 + self.ue_sinr
+        priority = PRIORITY_TRAFFIC_TYPE[self.ue_traffic_type]
+
+        proportional_weights = self.ue_buffer_size * weight * priority
+        total_weighted_buffer = proportional_weights.sum(axis=1, keepdims=True)
 
         # Normalize weights
-        if total_weighted_buffer > 0:
-            for ue in proportional_weights:
-                proportional_weights[ue] /= total_weighted_buffer
+        np.divide(proportional_weights, total_weighted_buffer, out=proportional_weights,
+                  where=total_weighted_buffer > 0)
 
         return proportional_weights
 
@@ -506,91 +792,66 @@ class ORAN:
         Allocate RBs to UEs based on their proportional weights.
         :return:
         """
-        rbs_available = [rb.rth for rb in self.RBs if rb.allocate_to is None]
-        num_rbs_available = len(rbs_available)
         proportional_weights = self.get_proportional_weights()
+        num_rbs_available = self.scheduler.allocate(proportional_weights, self.ue_serving_gnb,
+                                                    self.ue_num_rbs_allocated)
 
-        if num_rbs_available == 0:
-            return
-
-        print(f"num_rbs_available: {num_rbs_available}")
-        # Sort UEs by their proportional weights (descending)
-        sorted_ues = sorted(proportional_weights.keys(), key=lambda ue: proportional_weights[ue], reverse=True)
-
-        # Perform RBs allocation
-        idx_rb = 0
-        while idx_rb < num_rbs_available:
-            for ue in sorted_ues:
-                if idx_rb >= num_rbs_available:
-                    break
-                self.RBs[rbs_available[idx_rb]].allocate_to = ue
-                ue.num_rbs_allocated += 1
-                idx_rb += 1
-
-        # # Allocate RBs to each UE based on its proportional weight
-        # for ue, weight in proportional_weights.items():
-        #     num_rbs_allocated = int(weight * num_rbs_available)
-        #     for idx in range(num_rbs_allocated):
-        #         ue.num_rbs_allocated += 1
-        #         self.RBs[rbs_available[0]].allocate_to = ue
-        #         rbs_available.pop(0)
+        if self.telemetry.enabled(DEBUG) and num_rbs_available.any():
+            self.telemetry.emit(DEBUG, 'rbs_available', num_rbs_available=num_rbs_available)
 
     def recycle_rbs(self):
         """
-        Recycle unused RBs
+        Recycle RBs of UEs with an empty buffer or inactive traffic
         :return:
         """
-        for rb in self.RBs:
-            if rb.allocate_to is not None:
-                if rb.allocate_to.buffer_size == 0 or not rb.allocate_to.is_active:
-                    rb.allocate_to.num_rbs_allocated -= 1
-                    rb.allocate_to.num_rbs_allocated = max(0, rb.allocate_to.num_rbs_allocated)
-                    rb.allocate_to = None
+        release = (self.ue_buffer_size == 0) | ~self.ue_is_active
+        self.scheduler.recycle(release, self.ue_num_rbs_allocated)
 
-    def perform_handover(self):
+    def perform_handover(self, current_time=0):
         """
-        Perform handover for UEs based on SINR and Dynamic TTT.
-        When a gNB is activated or deactivated, UEs are redistributed
+        Perform handover for UEs based on RSRP, hysteresis and dynamic TTT.
+        Only UEs in RLF whose serving gNB is active are considered, transmitting gNBs are the candidates.
+        :param current_time: scalar or (num_envs,) time of each environment, recorded in the handover log
         :return:
         """
-        for gnb in self.gNBs:
-            # Only consider handover if gNB is inactive
-            if not gnb.is_active:
-                continue
+        serving_active = np.take_along_axis(self.gnb_is_active, self.ue_serving_gnb, axis=1)
+        eligible = self.ue_in_rlf & serving_active
 
-            for ue in gnb.UEs:
-                if ue.in_rlf:
-                    target_gnb = self.select_target_gnb(ue)
+        env_idx, ue_idx, target_gnbs, margins = self.handover.update(
+            self.channel.rsrp, self.channel.transmitting > 0, self.ue_serving_gnb, eligible, TIME_STEP)
+        if len(ue_idx) == 0:
+            return
 
-                    if target_gnb:
-                        self.handover_ue(ue, target_gnb)
+        self.handover.log(np.ravel(current_time), env_idx, ue_idx, self.ue_serving_gnb[env_idx, ue_idx],
+                          target_gnbs, margins)
+        self.handover_ues(env_idx, ue_idx, target_gnbs)
 
-    def select_target_gnb(self, ue):
+    def handover_ues(self, env_idx, ue_idx, target_gnbs):
         """
-        Select a target gNB for handover baesd on SINR and dynamic TTT.
-        The TTT decreases proportionally with the SINR difference
-        :param ue:
+        Perform handover for UEs from their current gNB to target gNBs
+        :param env_idx: environment indices of the UEs
+        :param ue_idx: indices of the UEs
+        :param target_gnbs: indices of the target gNBs
         :return:
         """
-        target_gnb = None
-        best_sinr_diff = float('inf')
-
-        for gnb in self.gNBs:
-            if gnb == ue.serving_gnb:
-                continue
+        if len(ue_idx) == 0:
+            return
 
-            # Calculate SINR difference between the current gNB and target gnbs
-            sinr_diff = np.abs(ue.get_sinr([gnb]) - ue.get_sinr([ue.serving_gnb]))
+        source_gnbs = self.ue_serving_gnb[env_idx, ue_idx]
+        self.ue_serving_gnb[env_idx, ue_idx] = target_gnbs
 
-            # Calculate TTT based on SINR difference
-            ttt = max(0, 1 - sinr_diff)
+        # Reset UEs' RLF status
+        self.ue_buffer_size[env_idx, ue_idx] = 0
+        self.ue_delay[env_idx, ue_idx] = 0
+        self.ue_num_rbs_allocated[env_idx, ue_idx] = 0
+        self.ue_in_rlf[env_idx, ue_idx] = False
+        self.kpms_dirty = True
 
-            # Select gNB with the best SINR difference
-            if sinr_diff < best_sinr_diff and ttt > 0:
-                best_sinr_diff = sinr_diff
-                target_gnb = gnb
+        self.update_num_rbs_allocated()
 
-        return target_gnb
+        if self.telemetry.enabled(DEBUG):
+            self.telemetry.emit(DEBUG, 'handover', env=env_idx, ue=ue_idx, source=source_gnbs,
+                                target=np.asarray(target_gnbs))
 
     def handover_ue(self, ue, target_gnb):
         """
@@ -600,46 +861,97 @@ class ORAN:
         :return:
         """
         if target_gnb:
-            # Remove UE from the current gNB
-            ue.serving_gnb.UEs.remove(ue)
-            ue.serving_gnb.update_num_rbs_allocated()
-
-            # Add UE to the target gNB
-            target_gnb.add_ue(ue)
-            ue.serving_gnb = target_gnb
-            target_gnb.update_num_rbs_allocated()
-
-            # Reset UEs' RLF status
-            ue.reset()
-            print(f"Handover successful: UE moved from gNB {ue.serving_gnb} to gNB {target_gnb}")
-        else:
-            print("No suitable target gNB found for handover.")
+            self.handover_ues(np.array([ue.env]), np.array([ue.idx]), np.array([target_gnb.idx]))
+        elif self.telemetry.enabled(DEBUG):
+            self.telemetry.emit(DEBUG, 'handover_failed', env=ue.env, ue=ue.idx)
+
+    def update_kpms(self):
+        """
+        Calculate the KPMs of all gNBs in all environments, if the state changed since the last calculation.
+        State changes through update_system, reset_envs, restore and the UE/gNB views mark the KPMs dirty, code
+        writing the arrays directly sets kpms_dirty.
+        """
+        if not self.kpms_dirty:
+            return
+        self.kpms_dirty = False
+
+        # Per-cell sums over the serving cell index of the UEs
+        flat_gnb_idx = self.get_flat_gnb_idx()
+        self.gnb_num_ues[:] = self.get_cell_sums(flat_gnb_idx=flat_gnb_idx)
+        self.gnb_throughput[:] = self.get_cell_sums(self.ue_service_rate, flat_gnb_idx)
+        self.gnb_num_ues_rlf[:] = self.get_cell_sums(self.ue_in_rlf, flat_gnb_idx)
+        self.gnb_buffer_size[:] = self.get_cell_sums(self.ue_buffer_size, flat_gnb_idx)
+        np.divide(self.get_cell_sums(self.ue_delay, flat_gnb_idx), self.gnb_num_ues, out=self.gnb_mean_delay,
+                  where=self.gnb_num_ues > 0)
+        self.gnb_mean_delay[self.gnb_num_ues == 0] = 0
+
+        # Power consumption of RU (watts)
+        PPAM = gNB.PPAM_0 * (self.gnb_num_rbs_allocated / NUM_RBS) * gNB.eta_PAM * gNB.n_ant
+        self.gnb_power_consumption[:] = gNB.P0 + gNB.PRF + gNB.PBB + PPAM
+
+        self.gnb_activate_cost[:] = 0.9 ** (0.01 * self.gnb_active_time_interval * 1e3)
+
+    def get_rewards(self):
+        """
+        Calculate sum reward over the active gNBs of each environment
+        :return: (num_envs,) rewards
+        """
+        w1, w2, w3, w4 = REWARD_WEIGHTS
+        self.update_kpms()
+
+        reward = (w1 * self.gnb_throughput - w2 * self.gnb_power_consumption - w3 * self.gnb_num_ues_rlf
+                  - w4 * self.gnb_activate_cost)
+
+        return (reward * self.gnb_is_active).sum(axis=1)
+
+    def get_states(self, out=None):
+        """
+        States of all the environments, written in place without intermediate arrays. Layout of a state row:
+        - per-cell block, num_gnbs * NUM_STATE_GNB values: the KPMs listed in gNB.get_state_gnb, gNB by gNB
+        - global block, NUM_STATE_GLOBAL values: the number of active gNBs
+        :param out: C-contiguous (num_envs, state_space) STATE_DTYPE array to write to, a new one if None
+        :return: (num_envs, state_space) states, out if given
+        """
+        if out is None:
+            out = np.empty((self.num_envs, self.state_space), dtype=STATE_DTYPE)
+
+        self.update_kpms()
+        state_gnbs = out[:, :-NUM_STATE_GLOBAL].reshape(self.num_envs, self.num_gnbs, NUM_STATE_GNB)
+        state_global = out[:, -NUM_STATE_GLOBAL:]
+
+        np.divide(self.gnb_throughput, self.gnb_power_consumption, out=state_gnbs[..., 0])
+        state_gnbs[..., 1] = self.gnb_num_ues_rlf
+        state_gnbs[..., 2] = 0
+        np.divide(self.gnb_num_ues_rlf, self.gnb_num_ues, out=state_gnbs[..., 2], where=self.gnb_num_ues > 0)
+        state_gnbs[..., 3] = self.gnb_num_rbs_allocated
+        np.divide(self.gnb_num_rbs_allocated, NUM_RBS, out=state_gnbs[..., 4])
+        state_gnbs[..., 5] = self.gnb_activate_cost
+        state_gnbs[..., 6] = self.gnb_power_tx
+
+        np.sum(self.gnb_is_active, axis=1, out=state_global[:, 0])
+
+        return out
 
     def get_sum_reward(self):
         """
-        Calculate sum reward for all gNBs at current time step
+        Calculate sum reward for all gNBs of the first environment at current time step
         :return:
         """
-        sum_reward = 0
-        for gnb in self.gNBs:
-            reward, kpms = gnb.get_reward()
-            sum_reward += reward
+        sum_reward = self.get_rewards()[0]
 
-            print(f"KPMs: {kpms}")
+        if self.telemetry.enabled(DEBUG):
+            self.telemetry.emit(DEBUG, 'kpms', is_active=self.gnb_is_active[0].copy(),
+                                throughput=self.gnb_throughput[0].copy(),
+                                power_consumption=self.gnb_power_consumption[0].copy(),
+                                num_ues_rlf=self.gnb_num_ues_rlf[0].copy(),
+                                activate_cost=self.gnb_activate_cost[0].copy(),
+                                buffer_size=self.gnb_buffer_size[0].copy(),
+                                mean_delay=self.gnb_mean_delay[0].copy())
 
         return sum_reward
 
     def get_state_oran(self):
         """
-        :return: state info for all the gNBs
+        :return: (state_space,) state of the first environment
         """
-        state_oran = []
-
-        # Add gnb state
-        for gnb in self.gNBs:
-            state_oran += gnb.get_state_gnb()
-
-        # Add global state
-        state_oran += [sum(1 for status in self.gnbs_active_status if status)]
-
-        return state_oran
\ No newline at end of file
+        return self.get_states()[0]
@@ -0,0 +1,243 @@
+# -- Public Imports
+import os
+import sys
+import copy
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+# -- Private Imports
+from utils import *
+from constants import *
+from oran import NUM_STATE_GNB, NUM_STATE_GLOBAL, SIM_PHASES, STATE_DTYPE
+from profiling import get_profiler, configure_profiling
+from topology import get_num_cells
+from rng import get_seed_sequence
+
+# -- Global Variables
+
+# Commands sent to the workers as raw bytes, so nothing is pickled per step
+CMD_STEP = b's'
+CMD_RESET = b'r'
+CMD_CLOSE = b'c'
+MSG_DONE = b'k'
+
+
+# -- Functions
+
+def get_shared_arrays(buf, num_workers, num_gnbs, state_space):
+    """
+    Lay out the arrays exchanged with the workers on one shared memory buffer
+    :param buf: buffer of the shared memory block, None to only compute its size
+    :return: dict of arrays and the total size in bytes
+    """
+    layout = (
+        ('actions', np.bool_, (num_workers, num_gnbs)),
+        ('states', STATE_DTYPE, (num_workers, state_space)),
+        ('final_states', STATE_DTYPE, (num_workers, state_space)),
+        ('rewards', np.float64, (num_workers,)),
+        ('dones', np.bool_, (num_workers,)),
+        ('timings', np.float64, (num_workers, len(SIM_PHASES))),
+    )
+
+    arrays = {}
+    offset = 0
+    for name, dtype, shape in layout:
+        # Keep every array 8-byte aligned
+        offset = -(-offset // 8) * 8
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if buf is not None:
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += nbytes
+
+    return arrays, offset
+
+
+def worker(conn, shm_name, idx_worker, num_workers, num_gnbs, state_space, seed, silent, config):
+    """
+    Worker process owning one ORANSimEnv, it reads its action from and writes its results to shared memory
+    :param seed: SeedSequence of the worker
+    """
+    from environment import ORANSimEnv
+
+    if silent:
+        sys.stdout = open(os.devnull, 'w')
+
+    # Every worker records or replays its own scenario trace
+    config = copy.copy(config)
+    for option in ('trace_record', 'trace_replay'):
+        if getattr(config, option, None):
+            setattr(config, option, os.path.join(getattr(config, option), f"worker_{idx_worker:03d}"))
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays, _ = get_shared_arrays(shm.buf, num_workers, num_gnbs, state_space)
+    configure_profiling(config)
+    env = ORANSimEnv(config, seed=seed)
+
+    try:
+        while True:
+            cmd = conn.recv_bytes()
+
+            if cmd == CMD_STEP:
+                next_state, reward, done, info = env.step(arrays['actions'][idx_worker])
+                arrays['final_states'][idx_worker] = next_state
+                arrays['rewards'][idx_worker] = reward
+                arrays['dones'][idx_worker] = done
+                if 'timings' in info:
+                    arrays['timings'][idx_worker] = [info['timings'].get(phase, 0) for phase in SIM_PHASES]
+
+                # Auto-reset the environment when it finished
+                arrays['states'][idx_worker] = env.reset() if done else next_state
+
+            elif cmd == CMD_RESET:
+                arrays['states'][idx_worker] = env.reset()
+                arrays['dones'][idx_worker] = False
+
+            elif cmd == CMD_CLOSE:
+                env.close()
+                break
+
+            conn.send_bytes(MSG_DONE)
+    finally:
+        del arrays
+        shm.close()
+        conn.close()
+
+
+class ParallelORANEnv:
+    """
+    Pool of subprocess workers, each owning an ORANSimEnv.
+    Actions, states, rewards and done flags are exchanged through one shared memory block, the pipes only carry
+    one-byte commands. Supports synchronous stepping (step) and asynchronous stepping of any subset of workers
+    (step_async / ready / step_wait). Finished environments are reset automatically, their final states are
+    kept in final_states.
+    """
+
+    def __init__(self, num_workers, seed=None, silent=True, start_method=None, config=None):
+        """
+        :param num_workers: Number of worker processes.
+        :param seed: Base seed, every worker gets an independent child SeedSequence.
+        :param silent: Discard the stdout of the workers.
+        :param start_method: multiprocessing start method, platform default if None.
+        :param config: configuration namespace passed to the simulator of every worker.
+        """
+        self.num_envs = num_workers
+        self.num_gnbs = get_num_cells(getattr(config, 'num_rings', NUM_RINGS))
+        self.state_space = self.num_gnbs * NUM_STATE_GNB + NUM_STATE_GLOBAL
+
+        _, size = get_shared_arrays(None, num_workers, self.num_gnbs, self.state_space)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.arrays, _ = get_shared_arrays(self.shm.buf, num_workers, self.num_gnbs, self.state_space)
+
+        seeds = get_seed_sequence(seed).spawn(num_workers)
+        ctx = mp.get_context(start_method)
+        self.conns = []
+        self.processes = []
+        for idx_worker in range(num_workers):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=worker, daemon=True,
+                                  args=(child_conn, self.shm.name, idx_worker, num_workers, self.num_gnbs, self.state_space,
+                                        seeds[idx_worker], silent, config))
+            process.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+        # Workers with a command in flight
+        self.pending = np.zeros(num_workers, dtype=bool)
+        self.closed = False
+
+    @property
+    def final_states(self):
+        return self.arrays['final_states'].copy()
+
+    def send(self, cmd, env_idx):
+        for idx in env_idx:
+            assert not self.pending[idx], f"Worker {idx} is still busy"
+            self.conns[idx].send_bytes(cmd)
+            self.pending[idx] = True
+
+    def wait(self, env_idx):
+        for idx in env_idx:
+            if self.pending[idx]:
+                self.conns[idx].recv_bytes()
+                self.pending[idx] = False
+
+    def step_async(self, action, env_idx=None):
+        """
+        Write the actions to shared memory and start stepping the given workers
+        :param action: (len(env_idx), num_gnbs) boolean gNB activation masks
+        :param env_idx: indices of the workers to step, all if None
+        """
+        env_idx = np.arange(self.num_envs) if env_idx is None else np.asarray(env_idx)
+        self.arrays['actions'][env_idx] = np.reshape(action, (len(env_idx), self.num_gnbs))
+        self.send(CMD_STEP, env_idx)
+
+    def ready(self, timeout=None):
+        """
+        :return: indices of the workers whose step finished (blocks until at least one finished or timeout)
+        """
+        busy = [self.conns[idx] for idx in np.flatnonzero(self.pending)]
+        finished = wait(busy, timeout)
+
+        return np.array(sorted(self.conns.index(conn) for conn in finished), dtype=np.int64)
+
+    def step_wait(self, env_idx=None):
+        """
+        Wait for the given workers to finish their step
+        :param env_idx: indices of the workers, all if None
+        :return: states, rewards and done flags of the given workers
+        """
+        env_idx = np.arange(self.num_envs) if env_idx is None else np.asarray(env_idx)
+        self.wait(env_idx)
+
+        return (self.arrays['states'][env_idx].copy(), self.arrays['rewards'][env_idx].copy(),
+                self.arrays['dones'][env_idx].copy())
+
+    def step(self, action):
+        """
+        :param action: (num_workers, num_gnbs) boolean gNB activation masks
+        :return: (num_workers, state_space) states, (num_workers,) rewards, (num_workers,) done flags and info dict,
+        with the (num_workers,) durations (sec) of the simulator phases of the workers in info['timings'] when
+        profiling is on
+        """
+        self.step_async(action)
+        next_state, reward, done = self.step_wait()
+
+        info = {}
+        if get_profiler().enabled:
+            info['timings'] = {phase: self.arrays['timings'][:, idx].copy() for idx, phase in enumerate(SIM_PHASES)}
+
+        return next_state, reward, done, info
+
+    def reset(self):
+        env_idx = np.arange(self.num_envs)
+        self.wait(env_idx)
+        self.send(CMD_RESET, env_idx)
+        self.wait(env_idx)
+
+        return self.arrays['states'].copy()
+
+    def close(self):
+        if self.closed:
+            return
+
+        env_idx = np.arange(self.num_envs)
+        self.wait(env_idx)
+        for conn in self.conns:
+            conn.send_bytes(CMD_CLOSE)
+        for process in self.processes:
+            process.join()
+        for conn in self.conns:
+            conn.close()
+
+        del self.arrays
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,126 @@
+# -- Public Imports
+import time
+import collections
+import numpy as np
+
+# -- Private Imports
+
+# -- Global Variables
+
+# Edges of the per-episode histograms of the phase durations (ms)
+HISTOGRAM_EDGES_MS = np.concatenate([[0], np.logspace(-3, 4, 29)])
+
+
+# -- Functions
+
+class Profiler:
+    """
+    Wall-clock timers of named phases.
+    Functions and methods are timed by replacing them with timed wrappers (methods on the instance only), a disabled
+    profiler returns them unchanged, so profiling off costs nothing. Durations are summed per phase within a step,
+    end_step moves the step durations to the episode history, pop_episode summarizes and clears it.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.step_times = collections.defaultdict(float)
+        self.episode_times = collections.defaultdict(list)
+
+    def configure(self, enabled):
+        self.enabled = enabled
+
+    def wrap(self, function, phase):
+        """
+        :return: function adding its wall time to the phase, or function itself if profiling is off
+        """
+        if not self.enabled:
+            return function
+
+        step_times = self.step_times
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                step_times[phase] += time.perf_counter() - start
+
+        return timed
+
+    def instrument(self, obj, phases):
+        """
+        Time methods of an object
+        :param phases: dict of method name to phase name, methods of the same phase add up
+        """
+        if not self.enabled:
+            return
+
+        for name, phase in phases.items():
+            setattr(obj, name, self.wrap(getattr(obj, name), phase))
+
+    def clear(self, phases):
+        """
+        Drop the durations of the given phases in the current step
+        """
+        for phase in phases:
+            self.step_times.pop(phase, None)
+
+    def get(self, phases):
+        """
+        :return: dict of the durations (sec) of the given phases that ran in the current step
+        """
+        return {phase: self.step_times[phase] for phase in phases if phase in self.step_times}
+
+    def merge(self, timings):
+        """
+        Add the durations of phases timed in other processes to the current step, phases already timed in this process
+        are kept
+        :param timings: dict of phase to duration (sec) or array of the durations of the workers, averaged
+        """
+        for phase, duration in timings.items():
+            if phase not in self.step_times:
+                self.step_times[phase] = float(np.mean(duration))
+
+    def end_step(self):
+        """
+        Move the durations of the current step to the episode history
+        """
+        for phase, duration in self.step_times.items():
+            self.episode_times[phase].append(duration)
+        self.step_times.clear()
+
+    def pop_episode(self):
+        """
+        Summaries of the per-step durations of every phase over the episode, the history is cleared
+        :return: dict of phase to dict of count, total, mean and percentiles (ms), and histogram counts over
+        HISTOGRAM_EDGES_MS
+        """
+        summaries = {}
+        for phase, durations in self.episode_times.items():
+            durations = np.asarray(durations) * 1e3
+            p50, p90, p99 = np.percentile(durations, (50, 90, 99))
+            summaries[phase] = dict(count=len(durations), total_ms=float(durations.sum()),
+                                    mean_ms=float(durations.mean()), p50_ms=float(p50), p90_ms=float(p90),
+                                    p99_ms=float(p99), max_ms=float(durations.max()),
+                                    histogram=np.histogram(durations, HISTOGRAM_EDGES_MS)[0])
+        self.episode_times.clear()
+
+        return summaries
+
+
+# Process-wide profiler, disabled until configured
+profiler = Profiler()
+
+
+def get_profiler():
+
+    return profiler
+
+
+def configure_profiling(config):
+    """
+    Configure the process-wide profiler from the configuration namespace, before the objects it times are created
+    :param config: namespace with profile
+    """
+    profiler.configure(getattr(config, 'profile', False))
+
+    return profiler
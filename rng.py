@@ -0,0 +1,72 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+
+# -- Global Variables
+
+# Subsystems drawing randomness, each one gets its own stream per environment
+SUBSYSTEMS = ('mobility', 'traffic', 'shadowing', 'placement')
+
+
+# -- Functions
+
+def get_seed_sequence(seed):
+    """
+    :param seed: int, SeedSequence or None (fresh entropy)
+    :return: SeedSequence
+    """
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+class RNGStreams:
+    """
+    Independent np.random.Generator streams per environment and subsystem, derived from one scenario seed with
+    SeedSequence.spawn. Environments draw from their own streams, so the trajectory of an environment does not depend
+    on the other environments of the batch, and no global random state is used.
+    """
+    def __init__(self, seed, num_envs):
+        """
+        :param seed: scenario seed (int, SeedSequence or None)
+        :param num_envs: number of environments
+        """
+        self.num_envs = num_envs
+        self.seed_sequence = get_seed_sequence(seed)
+
+        env_sequences = self.seed_sequence.spawn(num_envs)
+        subsystem_sequences = [env_sequence.spawn(len(SUBSYSTEMS)) for env_sequence in env_sequences]
+        self.generators = {name: [np.random.default_rng(sequences[idx]) for sequences in subsystem_sequences]
+                           for idx, name in enumerate(SUBSYSTEMS)}
+
+    def __getitem__(self, name):
+        """
+        :return: list of the generators of the subsystem, one per environment
+        """
+        return self.generators[name]
+
+    def get_state(self):
+        """
+        :return: (num_subsystems, num_envs, 6) uint64 PCG64 states (state and increment as 128-bit words, buffered
+        uint32)
+        """
+        state = np.zeros((len(SUBSYSTEMS), self.num_envs, 6), dtype=np.uint64)
+        for idx, name in enumerate(SUBSYSTEMS):
+            for idx_env, generator in enumerate(self.generators[name]):
+                bit_state = generator.bit_generator.state
+                words = (bit_state['state']['state'], bit_state['state']['inc'])
+                state[idx, idx_env, :4] = [word >> shift & 0xFFFFFFFFFFFFFFFF for word in words for shift in (0, 64)]
+                state[idx, idx_env, 4:] = bit_state['has_uint32'], bit_state['uinteger']
+
+        return state
+
+    def set_state(self, state):
+        """
+        Restore the generators from the output of get_state
+        """
+        for idx, name in enumerate(SUBSYSTEMS):
+            for idx_env, generator in enumerate(self.generators[name]):
+                words = [int(word) for word in state[idx, idx_env]]
+                generator.bit_generator.state = dict(
+                    bit_generator='PCG64',
+                    state=dict(state=words[0] | words[1] << 64, inc=words[2] | words[3] << 64),
+                    has_uint32=words[4], uinteger=words[5])
@@ -0,0 +1,252 @@
+# -- Public Imports
+import os
+import json
+import shutil
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+# UE state set by the scenario when an episode starts and at every step, stored per (env, UE)
+TRACE_INIT_DTYPE = np.dtype([('x', np.float64), ('y', np.float64), ('serving_gnb', np.int64),
+                             ('traffic_type', np.int8), ('data_rate', np.float64), ('is_active', np.bool_)])
+TRACE_STEP_DTYPE = np.dtype([('x', np.float64), ('y', np.float64), ('is_active', np.bool_),
+                             ('active_fraction', np.float64)])
+
+
+# -- Functions
+
+def get_episode_dir(path, episode):
+
+    return os.path.join(path, f"episode_{episode:05d}")
+
+
+def get_chunk_path(path, episode, chunk):
+
+    return os.path.join(get_episode_dir(path, episode), f"steps_{chunk:05d}.npy")
+
+
+class TraceRecorder:
+    """
+    Records the scenario of every episode: UE placement, data rates and shadowing maps when the episode starts, then
+    UE positions and traffic activity after every step. Every episode is a directory of .npy files, steps are
+    written in chunks of chunk_steps, and meta.json lists the episodes and their number of steps.
+    Only full resets of all environments start an episode, so traces are used with ORANSimEnv and the workers of
+    ParallelORANEnv, each recording its own trace, not with the partial auto-resets of VectorORANEnv.
+    """
+    def __init__(self, path, chunk_steps=TRACE_CHUNK_STEPS):
+        """
+        :param path: directory of the trace, created if missing
+        :param chunk_steps: number of steps per chunk file
+        """
+        self.path = path
+        self.chunk_steps = chunk_steps
+        os.makedirs(path, exist_ok=True)
+
+        self.meta = dict(chunk_steps=chunk_steps, num_steps=[])
+        self.chunk = None
+        self.num_steps = 0
+
+    def init_scenario(self, oran, env_idx):
+        """
+        Draw the scenario of a new episode and record it
+        """
+        if len(env_idx) != oran.num_envs:
+            raise ValueError("Scenario traces only record resets of all environments")
+        self.flush()
+        oran.init_scenario(env_idx)
+
+        episode = len(self.meta['num_steps'])
+        os.makedirs(get_episode_dir(self.path, episode), exist_ok=True)
+        init = np.zeros((oran.num_envs, oran.num_ues), dtype=TRACE_INIT_DTYPE)
+        for name in TRACE_INIT_DTYPE.names:
+            init[name] = getattr(oran, f"ue_{name}")
+        np.save(os.path.join(get_episode_dir(self.path, episode), 'init.npy'), init)
+        np.save(os.path.join(get_episode_dir(self.path, episode), 'shadowing.npy'), oran.shadowing.maps)
+
+        self.meta.update(num_envs=oran.num_envs, num_ues=oran.num_ues, num_gnbs=oran.num_gnbs)
+        self.meta['num_steps'].append(0)
+        self.chunk = np.zeros((self.chunk_steps, oran.num_envs, oran.num_ues), dtype=TRACE_STEP_DTYPE)
+        self.num_steps = 0
+        self.write_meta()
+
+    def update_scenario(self, oran, current_time):
+        """
+        Move the UEs and advance their traffic, then record the step
+        """
+        oran.update_scenario(current_time)
+
+        step = self.chunk[self.num_steps % self.chunk_steps]
+        for name in TRACE_STEP_DTYPE.names:
+            step[name] = getattr(oran, f"ue_{name}")
+        self.num_steps += 1
+        if self.num_steps % self.chunk_steps == 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the steps of the current chunk and update the metadata
+        """
+        if self.chunk is None or self.num_steps == self.meta['num_steps'][-1]:
+            return
+
+        episode = len(self.meta['num_steps']) - 1
+        chunk = (self.num_steps - 1) // self.chunk_steps
+        np.save(get_chunk_path(self.path, episode, chunk), self.chunk[:self.num_steps - chunk * self.chunk_steps])
+        self.meta['num_steps'][-1] = self.num_steps
+        self.write_meta()
+
+    def get_position(self):
+        """
+        :return: episode being recorded (-1 before the first) and number of its recorded steps
+        """
+        return len(self.meta['num_steps']) - 1, self.num_steps
+
+    def seek(self, episode, step):
+        """
+        Return to a position of get_position when the simulator is restored to it, the episodes and steps recorded
+        after it are dropped and recorded again
+        """
+        self.flush()
+        if episode >= len(self.meta['num_steps']) or step > (self.meta['num_steps'][episode] if episode >= 0 else 0):
+            raise ValueError(f"Trace {self.path} has no step {step} of episode {episode}")
+
+        for dropped in range(episode + 1, len(self.meta['num_steps'])):
+            shutil.rmtree(get_episode_dir(self.path, dropped), ignore_errors=True)
+        del self.meta['num_steps'][episode + 1:]
+        self.num_steps = step
+        if episode < 0:
+            self.chunk = None
+            self.write_meta()
+            return
+
+        # Chunks after the one of the step are dropped, the steps of its chunk before the step are kept
+        chunk, num_kept = divmod(step, self.chunk_steps)
+        num_chunks = -(-self.meta['num_steps'][episode] // self.chunk_steps)
+        for dropped in range(chunk + 1, num_chunks):
+            os.remove(get_chunk_path(self.path, episode, dropped))
+        if self.chunk is None:
+            self.chunk = np.zeros((self.chunk_steps, self.meta['num_envs'], self.meta['num_ues']),
+                                  dtype=TRACE_STEP_DTYPE)
+        if num_kept:
+            self.chunk[:num_kept] = np.load(get_chunk_path(self.path, episode, chunk))[:num_kept]
+            np.save(get_chunk_path(self.path, episode, chunk), self.chunk[:num_kept])
+        elif chunk < num_chunks:
+            os.remove(get_chunk_path(self.path, episode, chunk))
+
+        self.meta['num_steps'][episode] = step
+        self.write_meta()
+
+    def write_meta(self):
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+    def close(self):
+        self.flush()
+
+
+class TraceReplay:
+    """
+    Replays a recorded scenario trace instead of sampling it. Episodes with steps are replayed in order and start
+    over after the last one, chunks are opened as memory-mapped arrays when the replay reaches them.
+    The shadowing maps, placement and traffic of the episode come from the trace, the random streams of these
+    subsystems are not used.
+    """
+    def __init__(self, path):
+        """
+        :param path: directory of a trace written by TraceRecorder
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.chunk_steps = self.meta['chunk_steps']
+        self.episodes = [episode for episode, num_steps in enumerate(self.meta['num_steps']) if num_steps > 0]
+        if not self.episodes:
+            raise ValueError(f"Trace {path} has no episode with steps")
+
+        self.episode_idx = -1
+        self.episode = -1
+        self.num_steps = 0
+        self.chunk = None
+
+    def init_scenario(self, oran, env_idx):
+        """
+        Load the scenario of the next episode
+        """
+        if len(env_idx) != oran.num_envs:
+            raise ValueError("Scenario traces only replay resets of all environments")
+        if (self.meta['num_envs'], self.meta['num_ues'], self.meta['num_gnbs']) != \
+                (oran.num_envs, oran.num_ues, oran.num_gnbs):
+            raise ValueError(f"Trace {self.path} was recorded with {self.meta['num_envs']} environments, "
+                             f"{self.meta['num_ues']} UEs and {self.meta['num_gnbs']} gNBs")
+
+        self.episode_idx = (self.episode_idx + 1) % len(self.episodes)
+        self.episode = self.episodes[self.episode_idx]
+        self.num_steps = 0
+        self.chunk = None
+
+        episode_dir = get_episode_dir(self.path, self.episode)
+        init = np.load(os.path.join(episode_dir, 'init.npy'), mmap_mode='r')
+        for name in TRACE_INIT_DTYPE.names:
+            getattr(oran, f"ue_{name}")[:] = init[name]
+        # New maps rather than a copy into the current ones, which are read-only when loaded from a shadowing cache
+        maps = np.load(os.path.join(episode_dir, 'shadowing.npy'))
+        if maps.shape != oran.shadowing.maps.shape:
+            raise ValueError(f"Trace {self.path} has shadowing maps of shape {maps.shape}, the simulator "
+                             f"{oran.shadowing.maps.shape}")
+        oran.shadowing.maps = maps
+
+    def update_scenario(self, oran, current_time):
+        """
+        Set the UE positions and traffic activity of the next step
+        """
+        if self.num_steps >= self.meta['num_steps'][self.episode]:
+            raise IndexError(f"Episode {self.episode} of trace {self.path} has "
+                             f"{self.meta['num_steps'][self.episode]} steps")
+
+        if self.num_steps % self.chunk_steps == 0:
+            self.chunk = np.load(get_chunk_path(self.path, self.episode, self.num_steps // self.chunk_steps),
+                                 mmap_mode='r')
+        step = self.chunk[self.num_steps % self.chunk_steps]
+        for name in TRACE_STEP_DTYPE.names:
+            getattr(oran, f"ue_{name}")[:] = step[name]
+        self.num_steps += 1
+
+    def get_position(self):
+        """
+        :return: episode being replayed (-1 before the first) and number of its replayed steps
+        """
+        return self.episode, self.num_steps
+
+    def seek(self, episode, step):
+        """
+        Return to a position of get_position when the simulator is restored to it
+        """
+        if episode >= 0 and (episode not in self.episodes or step > self.meta['num_steps'][episode]):
+            raise ValueError(f"Trace {self.path} has no step {step} of episode {episode}")
+
+        self.episode_idx = self.episodes.index(episode) if episode >= 0 else -1
+        self.episode = episode
+        self.num_steps = step
+
+        # The chunk of the step is opened by update_scenario when the step starts a chunk
+        self.chunk = None
+        if step % self.chunk_steps:
+            self.chunk = np.load(get_chunk_path(self.path, episode, step // self.chunk_steps), mmap_mode='r')
+
+    def close(self):
+        self.chunk = None
+
+
+def open_trace(config):
+    """
+    Scenario trace of the configuration namespace: recorder of --trace_record, replay of --trace_replay, or None
+    """
+    if getattr(config, 'trace_replay', None):
+        return TraceReplay(config.trace_replay)
+    if getattr(config, 'trace_record', None):
+        return TraceRecorder(config.trace_record)
+
+    return None
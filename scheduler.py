@@ -0,0 +1,160 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+
+# -- Functions
+
+def rank_in_group(group, key):
+    """
+    Rank of every element within its group when sorted by descending key (ties keep their order)
+    :param group: (n,) group index of each element
+    :param key: (n,) sorting key
+    :return: (n,) rank, 0 for the largest key of each group
+    """
+    order = np.lexsort((-key, group))
+    group_start = np.searchsorted(group[order], group[order], side='left')
+
+    rank = np.empty(len(group), dtype=np.int64)
+    rank[order] = np.arange(len(group)) - group_start
+
+    return rank, order
+
+
+class ProportionalScheduler:
+    """
+    Proportional RB scheduler over integer RB ownership grids.
+    rb_owner holds, for every environment and RB pool, the index of the UE each RB is allocated to (-1 if free).
+    With a shared grid all gNBs of an environment draw from one pool of NUM_RBS RBs, with per-cell grids every gNB
+    owns NUM_RBS RBs and only schedules its own UEs.
+    """
+    def __init__(self, num_envs, num_ues, num_gnbs, per_cell=False):
+        self.num_envs = num_envs
+        self.num_ues = num_ues
+        self.num_gnbs = num_gnbs
+        self.per_cell = per_cell
+        self.num_pools = num_gnbs if per_cell else 1
+
+        self.rb_owner = np.full((num_envs, self.num_pools, NUM_RBS), -1, dtype=np.int64)
+
+    def reset(self, env_idx):
+        self.rb_owner[env_idx] = -1
+
+    def get_ue_pool(self, serving_gnb):
+        """
+        :return: (num_envs, num_ues) index of the RB pool of each UE in the flattened (num_envs * num_pools) pools
+        """
+        pool = serving_gnb if self.per_cell else np.zeros_like(serving_gnb)
+
+        return pool + np.arange(self.num_envs)[:, None] * self.num_pools
+
+    def recycle(self, release, num_rbs_allocated):
+        """
+        Free the RBs owned by the released UEs
+        :param release: (num_envs, num_ues) boolean mask of UEs giving back their RBs
+        :param num_rbs_allocated: (num_envs, num_ues) RB counters of the UEs, updated in place
+        """
+        rb_owner = self.rb_owner.reshape(self.num_envs, -1)
+        owned = rb_owner >= 0
+        recycle = owned & np.take_along_axis(release, np.where(owned, rb_owner, 0), axis=1)
+
+        flat_owner = rb_owner + np.arange(self.num_envs)[:, None] * self.num_ues
+        num_rbs_recycled = np.bincount(flat_owner[recycle], minlength=self.num_envs * self.num_ues)
+        rb_owner[recycle] = -1
+
+        num_rbs_allocated -= num_rbs_recycled.reshape(self.num_envs, self.num_ues)
+        np.maximum(num_rbs_allocated, 0, out=num_rbs_allocated)
+
+    def get_num_rbs(self, weights, ue_pool, num_rbs_available, max_rbs=None):
+        """
+        Split the free RBs of every pool between its UEs proportionally to their weights.
+        Counts are floored and the leftover RBs go to the largest remainders. A pool whose UEs all have zero weight
+        is split equally.
+        :param weights: (n,) non-negative weights
+        :param ue_pool: (n,) flat pool index of each UE
+        :param num_rbs_available: (num_pools_total,) free RBs per pool
+        :param max_rbs: (n,) largest grant of each UE, no limit if None. RBs above the limit are split again between
+        the UEs of the pool below their limit, pools whose UEs are all at their limit keep them free.
+        :return: (n,) number of RBs granted to each UE
+        """
+        if max_rbs is not None:
+            num_rbs = np.minimum(self.get_num_rbs(weights, ue_pool, num_rbs_available), max_rbs)
+            while True:
+                num_rbs_left = num_rbs_available - np.bincount(ue_pool, weights=num_rbs,
+                                                               minlength=len(num_rbs_available)).astype(np.int64)
+                idx_open = np.flatnonzero((num_rbs < max_rbs) & (num_rbs_left[ue_pool] > 0))
+                if not len(idx_open):
+                    return num_rbs
+
+                num_rbs[idx_open] = np.minimum(num_rbs[idx_open] + self.get_num_rbs(
+                    weights[idx_open], ue_pool[idx_open], num_rbs_left), max_rbs[idx_open])
+
+        num_pools_total = len(num_rbs_available)
+        total_weight = np.bincount(ue_pool, weights=weights, minlength=num_pools_total)
+        num_ues_pool = np.bincount(ue_pool, minlength=num_pools_total)
+
+        # Fall back to equal shares in pools without any weight
+        weights = np.where(total_weight[ue_pool] > 0, weights, 1.0)
+        total_weight = np.where(total_weight > 0, total_weight, num_ues_pool)
+
+        share = weights / total_weight[ue_pool] * num_rbs_available[ue_pool]
+        num_rbs = np.floor(share).astype(np.int64)
+
+        # Distribute the leftover RBs by largest remainder
+        num_rbs_left = num_rbs_available - np.bincount(ue_pool, weights=num_rbs, minlength=num_pools_total)
+        rank, _ = rank_in_group(ue_pool, share - num_rbs)
+        num_rbs += rank < num_rbs_left[ue_pool]
+
+        return num_rbs
+
+    def allocate(self, weights, serving_gnb, num_rbs_allocated):
+        """
+        Allocate the free RBs of every pool to its UEs proportionally to their weights
+        :param weights: (num_envs, num_ues) proportional weights
+        :param serving_gnb: (num_envs, num_ues) index of the serving gNB of each UE
+        :param num_rbs_allocated: (num_envs, num_ues) RB counters of the UEs, updated in place
+        :return: (num_envs, num_pools) number of free RBs before the allocation
+        """
+        rb_owner = self.rb_owner.reshape(self.num_envs * self.num_pools, NUM_RBS)
+        rbs_available = rb_owner < 0
+        num_rbs_available = rbs_available.sum(axis=1)
+        if not num_rbs_available.any():
+            return num_rbs_available.reshape(self.num_envs, self.num_pools)
+
+        ue_pool = self.get_ue_pool(serving_gnb).ravel()
+        weights = np.maximum(weights.ravel(), 0)
+
+        # Per-UE RB counts, UEs ordered by pool then descending weight
+        num_rbs = self.get_num_rbs(weights, ue_pool, num_rbs_available)
+        _, order = rank_in_group(ue_pool, weights)
+        rbs_owner = np.repeat(order, num_rbs[order]) % self.num_ues
+
+        # Free RBs of every pool are handed out in RB order, pools without UEs keep their RBs free
+        num_rbs_granted = np.bincount(ue_pool, weights=num_rbs, minlength=len(rb_owner)).astype(np.int64)
+        rank = np.cumsum(rbs_available, axis=1) - 1
+        rbs_granted = rbs_available & (rank < num_rbs_granted[:, None])
+        rb_owner[rbs_granted] = rbs_owner
+
+        num_rbs_allocated += num_rbs.reshape(self.num_envs, self.num_ues)
+
+        return num_rbs_available.reshape(self.num_envs, self.num_pools)
+
+    def assign(self, serving_gnb, num_rbs_allocated):
+        """
+        Rebuild the RB grids from per-UE RB counts, every pool hands out its first RBs in UE order
+        :param serving_gnb: (num_envs, num_ues) index of the serving gNB of each UE
+        :param num_rbs_allocated: (num_envs, num_ues) RB counts of the UEs, at most NUM_RBS per pool
+        """
+        rb_owner = self.rb_owner.reshape(self.num_envs * self.num_pools, NUM_RBS)
+        ue_pool = self.get_ue_pool(serving_gnb).ravel()
+        num_rbs = num_rbs_allocated.ravel()
+
+        order = np.argsort(ue_pool, kind='stable')
+        num_rbs_pool = np.bincount(ue_pool, weights=num_rbs, minlength=len(rb_owner))
+
+        rb_owner.fill(-1)
+        rb_owner[np.arange(NUM_RBS) < num_rbs_pool[:, None]] = np.repeat(order, num_rbs[order]) % self.num_ues
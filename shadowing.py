@@ -0,0 +1,158 @@
+# -- Public Imports
+import os
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+
+# -- Functions
+
+def get_correlated_map(shape, resolution, decorrelation_distance, std, rng, size=()):
+    """
+    Gaussian random fields with exponential spatial correlation exp(-d / decorrelation_distance) (Gudmundson model).
+    White noise is drawn directly in the frequency domain and shaped by the square root of the power spectrum of
+    the correlation, so only one inverse FFT is needed per field.
+    :param shape: (height, width) of the grid
+    :param resolution: grid spacing in meters
+    :param decorrelation_distance: distance at which the correlation drops to 1/e (in meters)
+    :param std: standard deviation of the field (in dB)
+    :param rng: np.random.Generator of the noise
+    :param size: leading shape, one independent field per entry
+    :return: size + shape float32 array
+    """
+    height, width = shape
+
+    # Periodic distances from the origin of the grid
+    dy = np.minimum(np.arange(height), height - np.arange(height)) * resolution
+    dx = np.minimum(np.arange(width), width - np.arange(width)) * resolution
+    correlation = np.exp(-np.hypot(dy[:, None], dx[None, :]) / decorrelation_distance)
+
+    # Power spectrum of the correlation, negative values are numerical noise
+    amplitude = np.sqrt(np.maximum(np.fft.rfft2(correlation).real, 0))
+
+    noise = rng.normal(0, 1, size=tuple(size) + amplitude.shape + (2,)).view(np.complex128)[..., 0]
+    field = np.fft.irfft2(noise * amplitude, s=shape)
+
+    # Normalize every field to the requested std
+    field -= field.mean(axis=(-2, -1), keepdims=True)
+    field *= std / field.std(axis=(-2, -1), keepdims=True)
+
+    return field.astype(np.float32)
+
+
+class ShadowingMaps:
+    """
+    Precomputed shadow-fading maps, one per environment and gNB, on regular grids. With a radius, the map of every
+    gNB only covers a square window of that half-size around it, shifted to stay within the scenario, so memory and
+    drawing time grow with the number of gNBs times the window rather than times the whole area. Without a radius
+    every map covers the whole scenario.
+    Maps are drawn when an environment is reset, or loaded once from a cached .npy file and then kept for every
+    scenario. They are looked up at the UE positions by bilinear interpolation, so every UE sees the same shadowing
+    for the same position and gNB.
+    """
+    def __init__(self, num_envs, topology, rngs, radius=None, resolution=SHADOWING_RESOLUTION,
+                 decorrelation_distance=SHADOWING_DECORRELATION, std=SHADOWING_STD, cache_path=None):
+        """
+        :param topology: HexTopology of the gNBs, positions outside its extent are clamped
+        :param rngs: list of np.random.Generator, one per environment
+        :param radius: half-size of the window of every gNB (in meters), the whole extent if None
+        :param resolution: grid spacing in meters
+        :param decorrelation_distance: decorrelation distance of the shadowing (in meters)
+        :param std: standard deviation of the shadowing (in dB)
+        :param cache_path: .npy file the maps are loaded from if it matches the grid, or saved to otherwise
+        """
+        self.num_envs = num_envs
+        self.num_gnbs = topology.num_cells
+        self.topology = topology
+        self.rngs = rngs
+        self.resolution = resolution
+        self.decorrelation_distance = decorrelation_distance
+        self.std = std
+
+        x_min, y_min, x_max, y_max = topology.extent
+        self.width = int(np.ceil((x_max - x_min) / resolution)) + 1
+        self.height = int(np.ceil((y_max - y_min) / resolution)) + 1
+
+        # (num_gnbs,) lower-left corner of the map of every gNB
+        self.windowed = radius is not None and 2 * radius < max(x_max - x_min, y_max - y_min)
+        if self.windowed:
+            size = int(np.ceil(2 * radius / resolution)) + 1
+            width, height = min(size, self.width), min(size, self.height)
+            self.x_origin = np.clip(topology.gnb_x - radius, x_min, x_min + (self.width - width) * resolution)
+            self.y_origin = np.clip(topology.gnb_y - radius, y_min, y_min + (self.height - height) * resolution)
+            self.width, self.height = width, height
+        else:
+            self.x_origin = np.full(self.num_gnbs, x_min)
+            self.y_origin = np.full(self.num_gnbs, y_min)
+
+        shape = (num_envs, self.num_gnbs, self.height, self.width)
+        self.cached = False
+        if cache_path is not None and os.path.exists(cache_path):
+            maps = np.load(cache_path, mmap_mode='r')
+            self.cached = maps.shape == shape
+            if self.cached:
+                self.maps = maps
+
+        if cache_path is not None and not self.cached:
+            self.maps = np.stack([self.get_maps(rng) for rng in rngs])
+            self.save(cache_path)
+            self.cached = True
+        elif not self.cached:
+            # Drawn by reset
+            self.maps = np.zeros(shape, dtype=np.float32)
+
+    def save(self, cache_path):
+        """
+        Write the maps to a temporary file renamed to cache_path, so that processes loading the cache concurrently
+        never read a partial file
+        """
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, self.maps)
+        os.replace(temp_path, cache_path)
+
+    def get_maps(self, rng):
+        """
+        :return: (num_gnbs, height, width) new maps drawn from rng
+        """
+        return get_correlated_map((self.height, self.width), self.resolution, self.decorrelation_distance, self.std,
+                                  rng, size=(self.num_gnbs,))
+
+    def reset(self, env_idx):
+        """
+        Draw new maps for the given environments, cached maps are kept
+        """
+        if not self.cached:
+            for idx in env_idx:
+                self.maps[idx] = self.get_maps(self.rngs[idx])
+
+    def lookup(self, x, y, gnb=None):
+        """
+        Bilinear interpolation of the maps of the given gNBs at the given positions
+        :param x, y: (num_envs, num_ues) positions in meters
+        :param gnb: (num_envs, num_ues, k) indices of the gNBs to look up for every UE, all gNBs if None
+        :return: (num_envs, num_ues, num_gnbs) or (num_envs, num_ues, k) shadowing in dB
+        """
+        env = np.arange(self.num_envs)[:, None, None]
+        gnb = np.arange(self.num_gnbs)[None, None, :] if gnb is None else gnb
+        x, y = x[..., None], y[..., None]
+
+        # Windows are centred on the gNBs, UEs are placed at their offset to the closest image of the gNB
+        if self.windowed:
+            dx, dy = self.topology.get_offsets(x - self.topology.gnb_x[gnb], y - self.topology.gnb_y[gnb])
+            x, y = self.topology.gnb_x[gnb] + dx, self.topology.gnb_y[gnb] + dy
+
+        fx = np.clip((x - self.x_origin[gnb]) / self.resolution, 0, self.width - 1)
+        fy = np.clip((y - self.y_origin[gnb]) / self.resolution, 0, self.height - 1)
+        ix = np.minimum(fx.astype(np.int64), self.width - 2)
+        iy = np.minimum(fy.astype(np.int64), self.height - 2)
+        wx = fx - ix
+        wy = fy - iy
+
+        top = (1 - wx) * self.maps[env, gnb, iy, ix] + wx * self.maps[env, gnb, iy, ix + 1]
+        bottom = (1 - wx) * self.maps[env, gnb, iy + 1, ix] + wx * self.maps[env, gnb, iy + 1, ix + 1]
+
+        return (1 - wy) * top + wy * bottom
@@ -0,0 +1,62 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+
+# -- Global Variables
+
+
+# -- Functions
+
+class StateLayout:
+    """
+    Byte layout of a fixed set of arrays in a flat uint8 snapshot blob.
+    The arrays are copied in and out through byte views, so packing and unpacking are one memcpy per array and the
+    arrays keep their identity (views and references to them stay valid after a restore).
+    """
+    def __init__(self, arrays):
+        """
+        :param arrays: dict of C-contiguous arrays, the order of the dict is the order in the blob
+        """
+        self.names = list(arrays)
+        self.shapes = [arrays[name].shape for name in self.names]
+        self.dtypes = [arrays[name].dtype for name in self.names]
+
+        sizes = [arrays[name].nbytes for name in self.names]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.size = int(self.offsets[-1])
+
+    def check(self, arrays):
+        """
+        Raise if the arrays do not match the layout
+        """
+        if list(arrays) != self.names:
+            raise ValueError(f"Snapshot arrays {list(arrays)} do not match the layout {self.names}")
+        for name, shape, dtype in zip(self.names, self.shapes, self.dtypes):
+            if arrays[name].shape != shape or arrays[name].dtype != dtype:
+                raise ValueError(f"Snapshot array {name} is {arrays[name].dtype}{arrays[name].shape}, "
+                                 f"expected {dtype}{shape}")
+
+    def pack(self, arrays, out=None):
+        """
+        Copy the arrays into a blob
+        :param arrays: dict of arrays matching the layout
+        :param out: blob to write into, a new one if None
+        :return: (size,) uint8 blob
+        """
+        blob = np.empty(self.size, dtype=np.uint8) if out is None else out
+        for name, start, end in zip(self.names, self.offsets[:-1], self.offsets[1:]):
+            blob[start:end] = arrays[name].reshape(-1).view(np.uint8)
+
+        return blob
+
+    def unpack(self, blob, arrays):
+        """
+        Copy a blob back into the arrays, in place
+        :param blob: (size,) uint8 blob written by pack
+        :param arrays: dict of arrays matching the layout
+        """
+        if len(blob) != self.size:
+            raise ValueError(f"Snapshot of {len(blob)} bytes, expected {self.size}")
+        for name, start, end in zip(self.names, self.offsets[:-1], self.offsets[1:]):
+            arrays[name].reshape(-1).view(np.uint8)[:] = blob[start:end]
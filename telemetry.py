@@ -0,0 +1,174 @@
+# -- Public Imports
+import json
+import time
+import collections
+import numpy as np
+
+# -- Private Imports
+
+# -- Global Variables
+
+# Telemetry levels, records below the level of the telemetry are dropped
+TRACE = 5        # Per-UE arrays, every step
+DEBUG = 10       # Per-gNB and per-event records (allocations, handovers, KPMs)
+INFO = 20        # Per-episode summaries
+WARNING = 30
+OFF = 100
+
+LEVELS = dict(trace=TRACE, debug=DEBUG, info=INFO, warning=WARNING, off=OFF)
+
+
+# -- Functions
+
+def to_builtin(value):
+    """
+    Convert numpy values of a record to JSON serializable values
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: to_builtin(item) for key, item in value.items()}
+
+    return value
+
+
+class RingSink:
+    """
+    Keeps the latest records in memory
+    """
+    def __init__(self, capacity=10000):
+        self.records = collections.deque(maxlen=capacity)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """
+    Writes one JSON record per line
+    """
+    def __init__(self, file_path):
+        self.file = open(file_path, 'a')
+
+    def __call__(self, record):
+        self.file.write(json.dumps({key: to_builtin(value) for key, value in record.items()}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class StdoutSink:
+    """
+    Prints the records, formatting only happens for records that passed the level, sampling and rate limits
+    """
+    def __call__(self, record):
+        fields = ', '.join(f"{key}={to_builtin(value)}" for key, value in record.items()
+                           if key not in ('event', 'level', 'time'))
+        print(f"{record['event']}: {fields}")
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    """
+    Forwards the records to a function
+    """
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, record):
+        self.callback(record)
+
+    def close(self):
+        pass
+
+
+class Telemetry:
+    """
+    Leveled telemetry routing structured records (dicts of scalars and arrays) to a sink.
+    Call sites check enabled(level) before building a record, so a disabled level costs one comparison. Records of
+    each event can be sampled (every n-th record) and rate limited (minimum wall time between records).
+    """
+    def __init__(self, level=OFF, sink=None, sample_every=1, min_interval=0):
+        """
+        :param level: minimum level of the emitted records
+        :param sink: callable receiving every emitted record, in-memory ring if None
+        :param sample_every: emit one record out of sample_every per event
+        :param min_interval: minimum wall time between two records of the same event (sec)
+        """
+        self.level = level
+        self.sink = RingSink() if sink is None else sink
+        self.sample_every = sample_every
+        self.min_interval = min_interval
+
+        self.counts = collections.Counter()
+        self.last_time = {}
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def configure(self, level=None, sink=None, sample_every=None, min_interval=None):
+        if level is not None:
+            self.level = LEVELS[level] if isinstance(level, str) else level
+        if sink is not None:
+            self.sink.close()
+            self.sink = sink
+        if sample_every is not None:
+            self.sample_every = sample_every
+        if min_interval is not None:
+            self.min_interval = min_interval
+
+    def emit(self, level, event, **fields):
+        """
+        Send a record to the sink if its level is enabled and it passes sampling and rate limiting.
+        Arrays are stored as given, callers pass copies of arrays updated in place.
+        :param level: level of the record
+        :param event: name of the record
+        :param fields: content of the record
+        """
+        if level < self.level:
+            return
+
+        count = self.counts[event]
+        self.counts[event] = count + 1
+        if count % self.sample_every:
+            return
+
+        now = time.monotonic()
+        if self.min_interval and now - self.last_time.get(event, -np.inf) < self.min_interval:
+            return
+        self.last_time[event] = now
+
+        self.sink(dict(event=event, level=level, time=time.time(), **fields))
+
+    def close(self):
+        self.sink.close()
+
+
+# Process-wide telemetry, disabled until configured
+telemetry = Telemetry()
+
+
+def get_telemetry():
+
+    return telemetry
+
+
+def configure_telemetry(config):
+    """
+    Configure the process-wide telemetry from the configuration namespace
+    :param config: namespace with telemetry_level, telemetry_sink, telemetry_file, telemetry_every
+    """
+    sinks = dict(ring=RingSink, stdout=StdoutSink,
+                 file=lambda: FileSink(getattr(config, 'telemetry_file', 'telemetry.jsonl')))
+    telemetry.configure(level=getattr(config, 'telemetry_level', 'off'),
+                        sink=sinks[getattr(config, 'telemetry_sink', 'ring')](),
+                        sample_every=getattr(config, 'telemetry_every', 1))
+
+    return telemetry
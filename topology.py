@@ -0,0 +1,152 @@
+# -- Public Imports
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+# Unit vectors of the hexagonal lattice (in units of the inter-site distance)
+HEX_BASIS = np.array([[1, 0], [0.5, np.sqrt(3) / 2]])
+
+
+# -- Functions
+
+def get_num_cells(num_rings):
+    """
+    :return: number of cells of a hexagonal grid with num_rings rings around the centre cell
+    """
+    return 1 + 3 * num_rings * (num_rings + 1)
+
+
+def get_hex_lattice(num_rings):
+    """
+    Axial coordinates of the cells of a hexagonal grid, ring by ring.
+    Every ring starts on the positive x axis and turns counter-clockwise.
+    :return: (num_cells, 2) integer axial coordinates
+    """
+    # Directions along the six sides of a ring, in axial coordinates
+    sides = np.array([[-1, 1], [-1, 0], [0, -1], [1, -1], [1, 0], [0, 1]])
+
+    cells = [np.zeros((1, 2), dtype=np.int64)]
+    for ring in range(1, num_rings + 1):
+        steps = np.repeat(sides, ring, axis=0)
+        cells.append(np.array([ring, 0]) + np.concatenate([[[0, 0]], np.cumsum(steps, axis=0)[:-1]]))
+
+    return np.concatenate(cells)
+
+
+class HexTopology:
+    """
+    Hexagonal multi-ring cell layout.
+    gNBs sit on a hexagonal lattice with num_rings rings around the centre cell (7, 19, 37, 61, 91... cells). With
+    wrap-around the layout is tiled periodically and UE-gNB distances are taken to the closest image of every gNB,
+    so edge cells see the same interference as the centre cell.
+    """
+    def __init__(self, num_rings=NUM_RINGS, inter_distance=INTER_DISTANCE_GNB, wrap_around=False,
+                 center=(2000, 2000)):
+        """
+        :param num_rings: number of rings around the centre cell
+        :param inter_distance: distance between neighbouring gNBs (in meters)
+        :param wrap_around: use wrap-around distances
+        :param center: position of the centre gNB
+        """
+        self.num_rings = num_rings
+        self.inter_distance = inter_distance
+        self.wrap_around = wrap_around
+        self.num_cells = get_num_cells(num_rings)
+
+        position = get_hex_lattice(num_rings) @ HEX_BASIS * inter_distance + np.asarray(center)
+        self.gnb_x, self.gnb_y = position[:, 0], position[:, 1]
+
+        # Shifts of the images of the layout: the neighbouring clusters of the hexagonal tiling
+        if wrap_around:
+            shift = np.array([2 * num_rings + 1, -num_rings])
+            rotations = [shift]
+            for _ in range(5):
+                rotations.append(np.array([-rotations[-1][1], rotations[-1][0] + rotations[-1][1]]))
+            self.image_offsets = np.concatenate([[[0, 0]], np.array(rotations) @ HEX_BASIS * inter_distance])
+        else:
+            self.image_offsets = np.zeros((1, 2))
+
+    @property
+    def extent(self):
+        """(x_min, y_min, x_max, y_max) area covered by the cells"""
+        margin = self.inter_distance / 2
+        return (self.gnb_x.min() - margin, self.gnb_y.min() - margin,
+                self.gnb_x.max() + margin, self.gnb_y.max() + margin)
+
+    def place_ues(self, serving_gnb, rng):
+        """
+        Uniform random positions within half an inter-site distance of the serving gNB
+        :param serving_gnb: array of serving gNB indices
+        :param rng: np.random.Generator of the positions
+        :return: x, y arrays shaped like serving_gnb
+        """
+        angle = rng.uniform(0, 2 * np.pi, size=np.shape(serving_gnb))
+        radius = rng.uniform(0, self.inter_distance / 2, size=np.shape(serving_gnb))
+
+        return (self.gnb_x[serving_gnb] + radius * np.cos(angle),
+                self.gnb_y[serving_gnb] + radius * np.sin(angle))
+
+    def get_offsets(self, dx, dy):
+        """
+        Fold UE-gNB offsets onto the closest image of the gNB (no-op without wrap-around)
+        :param dx, dy: arrays of offsets from the gNBs to the UEs
+        :return: folded dx, dy
+        """
+        if not self.wrap_around:
+            return dx, dy
+
+        image_dx = dx[..., None] - self.image_offsets[:, 0]
+        image_dy = dy[..., None] - self.image_offsets[:, 1]
+        closest = np.argmin(image_dx ** 2 + image_dy ** 2, axis=-1)[..., None]
+
+        return (np.take_along_axis(image_dx, closest, axis=-1)[..., 0],
+                np.take_along_axis(image_dy, closest, axis=-1)[..., 0])
+
+
+class NeighbourIndex:
+    """
+    Spatial grid index of the gNBs within a given radius.
+    The area is split into square bins, every bin stores the gNBs that may lie within the radius of any point of the
+    bin. UEs look up the gNBs of their bin, padded with -1 to the largest bin.
+    """
+    def __init__(self, topology, radius, bin_size=None):
+        """
+        :param topology: HexTopology of the gNBs
+        :param radius: interference radius (in meters)
+        :param bin_size: side of the bins (in meters), radius / 4 if None
+        """
+        self.radius = radius
+        self.bin_size = radius / 4 if bin_size is None else bin_size
+        self.x_min, self.y_min, x_max, y_max = topology.extent
+        self.num_x = max(int(np.ceil((x_max - self.x_min) / self.bin_size)), 1)
+        self.num_y = max(int(np.ceil((y_max - self.y_min) / self.bin_size)), 1)
+
+        # Distance from the centre of every bin to every gNB, bins are within half a diagonal of their centre
+        bin_x = self.x_min + (np.arange(self.num_x) + 0.5) * self.bin_size
+        bin_y = self.y_min + (np.arange(self.num_y) + 0.5) * self.bin_size
+        bin_x, bin_y = np.meshgrid(bin_x, bin_y, indexing='xy')
+        dx, dy = topology.get_offsets(bin_x.reshape(-1, 1) - topology.gnb_x, bin_y.reshape(-1, 1) - topology.gnb_y)
+        in_range = np.hypot(dx, dy) <= radius + self.bin_size * np.sqrt(2) / 2
+
+        # (num_bins, max_neighbours) gNB indices, in ascending order and padded with -1
+        self.max_neighbours = int(in_range.sum(axis=1).max())
+        order = np.argsort(~in_range, axis=1, kind='stable')[:, :self.max_neighbours]
+        self.neighbours = np.where(np.take_along_axis(in_range, order, axis=1), order, -1)
+
+    @property
+    def reach(self):
+        """Largest distance from a UE to the gNBs it looks up (in meters), the radius and half a bin diagonal"""
+        return self.radius + self.bin_size * np.sqrt(2) / 2
+
+    def get_neighbours(self, x, y):
+        """
+        :param x, y: arrays of UE positions, positions outside the area use the closest bin
+        :return: x.shape + (max_neighbours,) gNB indices, -1 for padding
+        """
+        idx_x = np.clip(((x - self.x_min) // self.bin_size).astype(np.int64), 0, self.num_x - 1)
+        idx_y = np.clip(((y - self.y_min) // self.bin_size).astype(np.int64), 0, self.num_y - 1)
+
+        return self.neighbours[idx_y * self.num_x + idx_x]
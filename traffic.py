@@ -0,0 +1,131 @@
+# -- Public Imports
+import heapq
+import numpy as np
+
+# -- Private Imports
+from constants import *
+
+# -- Global Variables
+
+# Traffic profile of each traffic type: data rates (bps) with their probabilities, and mean durations of the on and
+# off periods (sec), exponentially distributed. A zero mean off period means the traffic is always on.
+TRAFFIC_PROFILES = dict(
+    tcp_full=dict(rates=(20e6,), probs=(1.0,), mean_on=np.inf, mean_off=0),
+    udp_bursty=dict(rates=(20e6,), probs=(1.0,), mean_on=5, mean_off=5),
+    tcp_bursty=dict(rates=(750e3, 150e3), probs=(0.5, 0.5), mean_on=5, mean_off=5),
+)
+
+# Number of standard exponential draws buffered per environment
+DRAW_BLOCK = 1024
+
+
+# -- Functions
+
+class TrafficEngine:
+    """
+    Event-driven on/off traffic.
+    The next switch times of the bursty UEs of every environment are kept in a heap, advancing an interval only pops
+    the switches falling within it. Each UE can switch several times within one interval, the exact fraction of the
+    interval it was active is returned, so bursts shorter than a step still produce arrivals.
+    Durations are drawn in blocks of standard exponentials from the traffic stream of every environment.
+    """
+    def __init__(self, num_envs, num_ues, rngs, profiles=TRAFFIC_PROFILES):
+        """
+        :param rngs: list of np.random.Generator, one per environment
+        :param profiles: traffic profile of each traffic type
+        """
+        self.num_envs = num_envs
+        self.num_ues = num_ues
+        self.rngs = rngs
+        self.profiles = [profiles[traffic_type] for traffic_type in TRAFFIC_TYPES]
+
+        # Mean on and off durations indexed by traffic code
+        self.mean_on = np.array([profile['mean_on'] for profile in self.profiles], dtype=np.float64)
+        self.mean_off = np.array([profile['mean_off'] for profile in self.profiles], dtype=np.float64)
+
+        # Per-environment heaps of (switch time, UE index)
+        self.heaps = [[] for _ in range(num_envs)]
+
+        # Time of the last switch of every UE and active time accumulated over the current interval
+        self.last_switch_time = np.zeros((num_envs, num_ues))
+        self.active_time = np.zeros((num_envs, num_ues))
+
+        # Buffered standard exponential draws
+        self.draws = np.zeros((num_envs, DRAW_BLOCK))
+        self.num_draws_left = np.zeros(num_envs, dtype=np.int64)
+
+    def get_duration(self, idx_env, mean):
+        """
+        :return: exponential duration with the given mean, drawn from the buffer of the environment
+        """
+        if self.num_draws_left[idx_env] == 0:
+            self.draws[idx_env] = self.rngs[idx_env].standard_exponential(DRAW_BLOCK)
+            self.num_draws_left[idx_env] = DRAW_BLOCK
+        self.num_draws_left[idx_env] -= 1
+
+        return mean * self.draws[idx_env, self.num_draws_left[idx_env]]
+
+    def reset(self, env_idx, traffic_type, data_rate, is_active, next_switch_time):
+        """
+        Draw the data rates and restart the on/off processes of the given environments at time 0.
+        Bursty UEs start off and switch on at time 0, always-on UEs never switch.
+        :param traffic_type: (num_envs, num_ues) traffic codes
+        :param data_rate, is_active, next_switch_time: (num_envs, num_ues) UE arrays, updated in place
+        """
+        for idx_env in env_idx:
+            rng = self.rngs[idx_env]
+            for code, profile in enumerate(self.profiles):
+                ue_mask = traffic_type[idx_env] == code
+                data_rate[idx_env, ue_mask] = rng.choice(profile['rates'], size=int(ue_mask.sum()), p=profile['probs'])
+
+            is_bursty = self.mean_off[traffic_type[idx_env]] > 0
+            is_active[idx_env] = ~is_bursty
+            next_switch_time[idx_env] = np.where(is_bursty, 0, np.inf)
+            self.rebuild(idx_env, next_switch_time)
+
+        self.last_switch_time[env_idx] = 0
+        self.num_draws_left[env_idx] = 0
+
+    def rebuild(self, idx_env, next_switch_time):
+        """
+        Rebuild the heap of an environment from the next switch times
+        """
+        ue_idx = np.flatnonzero(np.isfinite(next_switch_time[idx_env]))
+        heap = list(zip(next_switch_time[idx_env, ue_idx].tolist(), ue_idx.tolist()))
+        heapq.heapify(heap)
+        self.heaps[idx_env] = heap
+
+    def advance(self, start_time, dt, traffic_type, is_active, next_switch_time, active_fraction):
+        """
+        Process the switches within [start_time, start_time + dt) of every environment
+        :param start_time: (num_envs,) start of the interval of each environment
+        :param dt: length of the interval (sec)
+        :param traffic_type: (num_envs, num_ues) traffic codes
+        :param is_active, next_switch_time: (num_envs, num_ues) UE arrays, updated in place
+        :param active_fraction: (num_envs, num_ues) fraction of the interval each UE was active, written in place
+        """
+        start_time = np.broadcast_to(start_time, (self.num_envs,))
+        end_time = start_time + dt
+        self.active_time.fill(0)
+
+        for idx_env, heap in enumerate(self.heaps):
+            t_start, t_end = start_time[idx_env], end_time[idx_env]
+            while heap and heap[0][0] < t_end:
+                t, idx_ue = heapq.heappop(heap)
+
+                # Close the period ending with this switch
+                if is_active[idx_env, idx_ue]:
+                    self.active_time[idx_env, idx_ue] += t - max(self.last_switch_time[idx_env, idx_ue], t_start)
+                self.last_switch_time[idx_env, idx_ue] = t
+                is_active[idx_env, idx_ue] = active = not is_active[idx_env, idx_ue]
+
+                # Schedule the next switch
+                code = traffic_type[idx_env, idx_ue]
+                t_next = t + self.get_duration(idx_env, self.mean_on[code] if active else self.mean_off[code])
+                next_switch_time[idx_env, idx_ue] = t_next
+                heapq.heappush(heap, (t_next, idx_ue))
+
+        # Close the periods still running at the end of the interval
+        period_start = np.maximum(self.last_switch_time, start_time[:, None])
+        self.active_time += is_active * (end_time[:, None] - period_start)
+        np.divide(self.active_time, dt, out=active_fraction)
@@ -8,6 +8,9 @@ from utils import *
 from constants import *
 from environment import UnifiedEnv
 from agents.dqn import BaseAgentDQN
+from oran import NUM_STATE_GNB, NUM_STATE_GLOBAL
+from telemetry import configure_telemetry, TRACE, INFO
+from profiling import configure_profiling, HISTOGRAM_EDGES_MS
 
 # -- Global Variables
 tf.get_logger().setLevel('ERROR')
@@ -15,93 +18,138 @@ tf.get_logger().setLevel('ERROR')
 # -- Functions
 
 def run_drl(args):
-    # Set seeds
-    # np.random.seed(args.seed)
-    # tf.keras.utils.set_random_seed(args.seed)
+    # Set seeds of the agent, the simulator draws from its own streams seeded with args.seed
+    np.random.seed(args.seed)
+    tf.keras.utils.set_random_seed(args.seed)
 
     # Initialize wandb
     wandb.init(project="DRL-ORAN-Energy",
                name="DRL for Energy Saving in ORAN",
                config=args)
 
+    # Route simulator and training records to the configured telemetry sink
+    telemetry = configure_telemetry(args)
+
+    # Time the simulator phases and the stages of the training loop, configured before the simulator is created
+    profiler = configure_profiling(args)
+
     # Initialize env and drl agent
-    env = UnifiedEnv(env_type=args.env, config=None)
+    env = UnifiedEnv(env_type=args.env, config=args)
+    num_envs = env.num_envs
     agent = BaseAgentDQN(args)
 
+    profiler.instrument(agent, dict(act='act', record='record', train='train'))
+    profiler.instrument(env, dict(step='env_step'))
+
+    def log_step(episode, step, reward, loss, state):
+        wandb.log({
+            "Episode": episode+1,
+            "Step": step+1,
+            "Step Reward": reward,
+            "Step Loss": loss,
+        })
+        if telemetry.enabled(TRACE):
+            state_0 = np.reshape(state, (num_envs, -1))[0]
+            telemetry.emit(TRACE, 'state', episode=episode, step=step,
+                           state_gnbs=np.reshape(state_0[:-NUM_STATE_GLOBAL], (-1, NUM_STATE_GNB)).copy())
+
+    log_step = profiler.wrap(log_step, 'logging')
+
     # Logging variables
     ep_rewards = []
     step_rewards = []
     avg_rewards = []
     ep_losses = []
     step_losses = []
+    total_steps = 0
 
     for episode in range(args.num_episodes):
         # Reset the environment at the start of each episode
         state = env.reset()
         episode_reward = 0
         episode_loss = 0
+        episode_num_losses = 0
 
         for step in range(args.max_step):
-            # Agent selects an action based on the current state
+            # Agent selects an action based on the current state (one per sub-environment for vectorized envs)
             action, action_idx = agent.act(state)
 
             # Execute the action in the environment
-            next_state, reward, done = env.step(action)
-            step_rewards.append(reward)
+            next_state, reward, done, info = env.step(action)
+            if 'timings' in info:
+                # Simulator phases timed by pool workers, the in-process envs already timed them here
+                profiler.merge(info['timings'])
 
-            # Store the experience in the replay buffer
-            agent.record((state, action_idx, reward, next_state))
+            # Store the experience in the replay buffer, auto-reset sub-environments end in their final state
+            final_state = next_state if num_envs == 1 else env.final_states
+            agent.record((state, action_idx, reward, final_state, done))
 
-            # Train behaviour and target models
-            loss = agent.update()
-            loss = loss.numpy()
-            episode_loss += loss
-            step_losses.append(loss)
-            agent.update_target()
+            # Average the reward over sub-environments
+            reward = np.mean(reward)
+            step_rewards.append(reward)
+
+            # Train behaviour and target models every train_freq steps, the gradient steps run in one compiled call
+            total_steps += 1
+            if total_steps % args.train_freq == 0:
+                agent.train(args.gradient_steps)
 
             # Update the current state and accumulate the episode reward
             state = next_state
             episode_reward += reward
 
-            # Log step info to wandb
-            wandb.log({
-                "Episode": episode+1,
-                "Step": step+1,
-                "Step Reward": reward,
-                "Step Loss": loss,
-            })
-            print(f"State 0: {state[:7]}\n"
-                  f"State 1: {state[7:14]}\n"
-                  f"State 2: {state[14:21]}\n"
-                  f"State 3: {state[21:28]}\n"
-                  f"State 4: {state[28:35]}\n"
-                  f"State 5: {state[35:42]}\n"
-                  f"State 6: {state[42:49]}\n")
-
-            # Terminate the episode if the environment signals completion
-            if done:
+            # Log step info to wandb every log_every steps, the losses only leave the device there
+            if (step + 1) % args.log_every == 0:
+                loss_sum, num_losses = agent.pop_loss()
+                episode_loss += loss_sum
+                episode_num_losses += num_losses
+                loss = loss_sum / max(num_losses, 1)
+                step_losses.append(loss)
+                log_step(episode, step, reward, loss, state)
+            if profiler.enabled:
+                profiler.end_step()
+
+            # Terminate the episode if the environment signals completion, vectorized envs reset on their own
+            if num_envs == 1 and done:
                 break
 
+        # Losses since the last logging boundary, averaged over the gradient steps of the episode
+        loss_sum, num_losses = agent.pop_loss()
+        avg_loss = (episode_loss + loss_sum) / max(episode_num_losses + num_losses, 1)
+
         # Log the episode results
         ep_rewards.append(episode_reward)
         avg_reward = np.mean(step_rewards[-args.max_step:])
         avg_rewards.append(avg_reward)
 
-        ep_losses.append(episode_loss / (step + 1))
+        ep_losses.append(avg_loss)
 
         # Log metrics to wandb
         wandb.log({
             "Episode": episode + 1,
             "Episode Reward": episode_reward,
             "Average Reward": avg_reward,
-            "Average Loss": episode_loss / (step + 1),
+            "Average Loss": avg_loss,
         })
 
+        telemetry.emit(INFO, 'episode', episode=episode, episode_reward=episode_reward, avg_reward=avg_reward,
+                       avg_loss=avg_loss)
+
+        # Per-episode histograms of the durations of the phases and loop stages
+        if profiler.enabled:
+            profile = profiler.pop_episode()
+            wandb.log({
+                "Episode": episode + 1,
+                **{f"Profile/{phase} (ms)": wandb.Histogram(np_histogram=(summary['histogram'], HISTOGRAM_EDGES_MS))
+                   for phase, summary in profile.items()},
+                **{f"Profile/{phase} mean (ms)": summary['mean_ms'] for phase, summary in profile.items()},
+            })
+            telemetry.emit(INFO, 'profile', episode=episode, **profile)
+
         # Print training progress
         print(f"Episode {episode + 1}/{args.num_episodes}: "
               f"Episode Reward = {episode_reward:.2e}, "
               f"Avg Reward = {avg_reward:.2e}, "
-              f"Average Loss = {episode_loss / (step + 1):.2e}, "
+              f"Average Loss = {avg_loss:.2e}, "
               f"Action = {action_idx}, ")
 
         # Save the model weights periodically
@@ -123,4 +171,6 @@ def run_drl(args):
     saves_lists(f"./lists/{args.agent}", ep_rewards, step_rewards, avg_rewards, ep_losses, step_losses)
 
     # Finish the wandb run
-    wandb.finish()
\ No newline at end of file
+    wandb.finish()
+    env.close()
+    telemetry.close()
\ No newline at end of file